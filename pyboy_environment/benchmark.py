@@ -0,0 +1,244 @@
+"""
+Benchmarks for the environments and result ranking.
+
+Results are written as JSON and compared against the previous run's baseline,
+any metric that got worse by more than the threshold is reported as a regression.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import time
+
+import numpy as np
+
+from pyboy_environment import suite
+from pyboy_environment.compare_results import rank_results
+from pyboy_environment.environments.fake_pyboy import fake_backend
+
+logging.basicConfig(level=logging.INFO)
+
+ENVIRONMENTS = {"pokemon": "brock", "mario": "run"}
+
+
+def get_args():
+    parse_args = argparse.ArgumentParser()
+
+    parse_args.add_argument("-d", "--domains", nargs="+", default=list(ENVIRONMENTS))
+
+    parse_args.add_argument("-a", "--act_freqs", nargs="+", type=int, default=[6, 24])
+
+    # Windowed runs need a display
+    parse_args.add_argument("--windowed", action="store_true")
+
+    parse_args.add_argument("--steps", type=int, default=1000)
+
+    parse_args.add_argument("--resets", type=int, default=20)
+
+    parse_args.add_argument("--calls", type=int, default=1000)
+
+    parse_args.add_argument(
+        "--sizes", nargs="+", type=int, default=[100, 1000, 10000, 100000]
+    )
+
+    # fake replays recorded memory instead of running the ROM, see fake_pyboy.py
+    parse_args.add_argument("--backend", choices=["pyboy", "fake"], default="pyboy")
+
+    parse_args.add_argument("--recording", type=str, default=None)
+
+    parse_args.add_argument("-b", "--baseline", type=str, default="benchmark.json")
+
+    parse_args.add_argument("-t", "--threshold", type=float, default=0.1)
+
+    parse_args.add_argument("--no_save", action="store_true")
+
+    parse_args.add_argument("-s", "--seed", type=int, default=0)
+
+    return parse_args.parse_args()
+
+
+def latency_stats(timings_ns):
+    timings_ns = np.asarray(timings_ns, dtype=np.float64)
+    p50, p90, p99 = np.percentile(timings_ns, [50, 90, 99])
+    return {
+        "mean_ns": float(np.mean(timings_ns)),
+        "p50_ns": float(p50),
+        "p90_ns": float(p90),
+        "p99_ns": float(p99),
+    }
+
+
+def time_calls(function, calls, setup=None):
+    timings = np.empty(calls, dtype=np.int64)
+    for i in range(calls):
+        if setup is not None:
+            setup()
+        start = time.perf_counter_ns()
+        function()
+        timings[i] = time.perf_counter_ns() - start
+    return timings
+
+
+def benchmark_environment(domain, act_freq, headless, args, backend):
+    env = suite.make(
+        domain, ENVIRONMENTS[domain], act_freq, 0, headless, backend=backend
+    )
+    results = {}
+
+    try:
+        results["reset"] = latency_stats(time_calls(env.reset, args.resets))
+
+        env.reset()
+        profiler = env.enable_profiling(args.steps)
+        for _ in range(args.steps):
+            _, _, done, truncated = env.step(np.atleast_1d(env.sample_action()))
+            if done or truncated:
+                env.reset()
+        env.disable_profiling()
+
+        step = latency_stats(profiler.phase_timings("step"))
+        step["steps_per_second"] = profiler.steps_per_second()
+        results["step"] = step
+        for phase, percentiles in profiler.percentiles((50, 99)).items():
+            if phase != "step":
+                results[f"step_{phase}"] = {
+                    "p50_ns": percentiles[50],
+                    "p99_ns": percentiles[99],
+                }
+
+        # Both are memoized per frame, so the cache is dropped before every call
+        results["game_stats"] = latency_stats(
+            time_calls(
+                env._generate_game_stats, args.calls, env._invalidate_frame_cache
+            )
+        )
+        results["get_state"] = latency_stats(
+            time_calls(env._get_state, args.calls, env._invalidate_frame_cache)
+        )
+    finally:
+        env.close()
+
+    return results
+
+
+def synthetic_summaries(size, rng):
+    badges = rng.integers(0, 2, size)
+    return [
+        {
+            "upi": f"upi{i}",
+            "badges": int(badges[i]),
+            "actions": int(rng.integers(0, 10000)),
+            "caught_pokemon": int(rng.integers(0, 5)),
+            "seen_pokemon": int(rng.integers(0, 20)),
+            "mean_level": float(rng.uniform(5, 15)),
+            "mean_xp": float(rng.uniform(0, 2000)),
+        }
+        for i in range(size)
+    ]
+
+
+def benchmark_ranking(sizes, rng, repeats=5):
+    results = {}
+    for size in sizes:
+        summaries = synthetic_summaries(size, rng)
+        timings = time_calls(lambda: rank_results(summaries), repeats)
+        # Best of a few repeats is the least noisy for a single call
+        results[f"rank_{size}"] = {"min_ns": float(np.min(timings))}
+    return results
+
+
+def run_benchmarks(args):
+    np.random.seed(args.seed)
+    rng = np.random.default_rng(args.seed)
+
+    backend = None
+    if args.backend == "fake":
+        backend = fake_backend(args.recording)
+
+    modes = [True, False] if args.windowed else [True]
+
+    results = {}
+    for domain in args.domains:
+        for act_freq in args.act_freqs:
+            for headless in modes:
+                name = f"{domain}_f{act_freq}_{'headless' if headless else 'windowed'}"
+                logging.info(f"Benchmarking {name}")
+                for metric, values in benchmark_environment(
+                    domain, act_freq, headless, args, backend
+                ).items():
+                    results[f"{name}/{metric}"] = values
+
+    logging.info("Benchmarking result ranking")
+    results.update(benchmark_ranking(args.sizes, rng))
+    return results
+
+
+def higher_is_better(metric):
+    return metric.endswith("per_second")
+
+
+def compare(baseline, results, threshold):
+    # Relative change per metric, positive means worse
+    regressions = []
+    for name, values in results.items():
+        previous_values = baseline.get(name, {})
+        for metric, value in values.items():
+            previous = previous_values.get(metric)
+            if not previous:
+                continue
+            change = (value - previous) / previous
+            if higher_is_better(metric):
+                change = -change
+            if change > threshold:
+                regressions.append((name, metric, previous, value, change))
+    return regressions
+
+
+def main():
+    args = get_args()
+
+    results = run_benchmarks(args)
+    report = {
+        "meta": {
+            "time": time.time(),
+            "backend": args.backend,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    for name, values in results.items():
+        logging.info(f"{name}: {values}")
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline["meta"]["backend"] != args.backend:
+            logging.warning(
+                f"Baseline backend is {baseline['meta']['backend']}, comparing anyway"
+            )
+        regressions = compare(baseline["results"], results, args.threshold)
+        for name, metric, previous, value, change in regressions:
+            logging.warning(
+                f"Regression {name} {metric}: {previous:.0f} -> {value:.0f} ({change:+.1%})"
+            )
+        if not regressions:
+            logging.info(
+                f"No regressions over {args.threshold:.0%} against {args.baseline}"
+            )
+
+    if not args.no_save:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
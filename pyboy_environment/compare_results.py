@@ -2,7 +2,8 @@ import argparse
 import glob
 import json
 import logging
-from functools import cmp_to_key
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 
@@ -47,11 +48,57 @@ def compare_performance(results_one, results_two):
     return 0
 
 
+def ranking_key(summary):
+    # Sorting ascending on this key gives the same order as compare_performance
+    badges = summary["badges"]
+    return (
+        -badges,
+        -summary["actions"] if badges > 0 else 0,
+        -summary["caught_pokemon"],
+        -summary["seen_pokemon"],
+        -summary["mean_level"],
+        -summary["mean_xp"],
+    )
+
+
+def summarise_result(upi, result):
+    # Only the fields needed for ranking are kept in memory
+    return {
+        "upi": upi,
+        "badges": result["badges"],
+        "actions": result["actions"],
+        "caught_pokemon": result["caught_pokemon"],
+        "seen_pokemon": result["seen_pokemon"],
+        "mean_level": float(np.mean(result["levels"])),
+        "mean_xp": float(np.mean(result["xp"])),
+    }
+
+
+def load_result(result_directory):
+    upi = result_directory.split("/")[-1]
+    logging.info(f"Reading results for UPI: {upi}")
+
+    with open(f"{result_directory}/results.json", "r", encoding="utf-8") as file:
+        return summarise_result(upi, json.load(file))
+
+
+def load_results(result_directories, workers):
+    # Bounded pool - map keeps the directory order so ties rank as before
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(load_result, result_directories))
+
+
+def rank_results(summaries):
+    return sorted(summaries, key=ranking_key)
+
+
 def get_args():
     parse_args = argparse.ArgumentParser()
 
     parse_args.add_argument("-r", "--results_path", type=str, required=True)
 
+    parse_args.add_argument("-w", "--workers", type=int, default=16)
+
     return parse_args.parse_args()
 
 
@@ -60,28 +107,20 @@ def main():
 
     results_path = args.results_path
 
-    result_directories = glob.glob(f"{results_path}/*")
+    # Only directories, stray files such as a job journal are not results
+    result_directories = [
+        path for path in glob.glob(f"{results_path}/*") if os.path.isdir(path)
+    ]
     logging.info(f"Found {len(result_directories)} results directories")
     logging.info(f"Results directories: {result_directories}")
 
     logging.info(f"Comparing results in {results_path}")
 
-    results = []
-    for result_directory in result_directories:
-        upi = result_directory.split("/")[-1]
-        logging.info(f"Reading results for UPI: {upi}")
-
-        with open(f"{result_directory}/results.json", "r", encoding="utf-8") as file:
-            result = json.load(file)
-            result["upi"] = upi
-
-            results.append(result)
-
-    results = sorted(results, key=cmp_to_key(compare_performance))
+    results = rank_results(load_results(result_directories, args.workers))
 
     for i, result in enumerate(results):
         logging.info(
-            f"Rank {i + 1}: {result['upi']} - Badges: {result['badges']} Caught: {result['caught_pokemon']} Seen: {result['seen_pokemon']} Levels: {np.mean(result['levels'])} XP: {np.mean(result['xp'])}"
+            f"Rank {i + 1}: {result['upi']} - Badges: {result['badges']} Caught: {result['caught_pokemon']} Seen: {result['seen_pokemon']} Levels: {result['mean_level']} XP: {result['mean_xp']}"
         )
 
 
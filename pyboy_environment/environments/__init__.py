@@ -1,3 +1,3 @@
-from .pyboy_environment import PyboyEnvironment
+from .pyboy_environment import PyboyEnvironment, gather_resets, gather_steps
 from .mario import MarioEnvironment
 from .pokemon import PokemonEnvironment
@@ -0,0 +1,22 @@
+# Helpers for decoding flag arrays stored in Game Boy RAM.
+#
+# Games store flag n in bit (n % 8) of byte (n // 8), so ranges of bytes are
+# unpacked least significant bit first.
+
+import numpy as np
+
+POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(data: np.ndarray) -> np.ndarray:
+    # Number of set bits in each byte
+    return POPCOUNT_TABLE[data]
+
+
+def count_flags(data: np.ndarray) -> int:
+    return int(POPCOUNT_TABLE[data].sum(dtype=np.uint32))
+
+
+def unpack_flags(data: np.ndarray) -> np.ndarray:
+    # One uint8 0/1 entry per flag, flag n at index n
+    return np.unpackbits(data, bitorder="little")
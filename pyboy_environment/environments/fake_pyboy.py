@@ -0,0 +1,276 @@
+# Deterministic stand-in for PyBoy that replays recorded memory snapshots.
+#
+# Covers the parts of the PyBoy API the environments use, so the Python side
+# can be benchmarked and load tested without a ROM or the emulator's cost.
+
+import io
+from typing import Callable
+
+import numpy as np
+from pyboy.plugins.game_wrapper_super_mario_land import mapping_compressed
+
+from pyboy_environment.environments import tilemap as tm
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+MEMORY_SIZE = 0x10000
+
+SCREEN_HEIGHT = 144
+SCREEN_WIDTH = 160
+
+SCY_ADDRESS = 0xFF42
+SCX_ADDRESS = 0xFF43
+WY_ADDRESS = 0xFF4A
+WX_ADDRESS = 0xFF4B
+
+OAM_ADDRESS = 0xFE00
+SPRITE_COUNT = 40
+
+
+class FakeMemory:
+    # Same indexing as pyboy.memory - ints for single addresses, lists for slices
+
+    def __init__(self) -> None:
+        self.array = np.zeros(MEMORY_SIZE, dtype=np.uint8)
+
+    def __getitem__(self, address):
+        if isinstance(address, slice):
+            return self.array[address].tolist()
+        return int(self.array[address])
+
+    def __setitem__(self, address, value) -> None:
+        self.array[address] = value
+
+
+class FakeScreen:
+    def __init__(self, memory: FakeMemory) -> None:
+        self.memory = memory
+        self.ndarray = np.zeros((SCREEN_HEIGHT, SCREEN_WIDTH, 4), dtype=np.uint8)
+
+    @property
+    def image(self):
+        if Image is None:
+            return None
+        return Image.fromarray(self.ndarray, "RGBA")
+
+    @property
+    def tilemap_position_list(self) -> list[list[int]]:
+        # No scanline effects, every line uses the current registers
+        line = [
+            self.memory[SCX_ADDRESS],
+            self.memory[SCY_ADDRESS],
+            self.memory[WX_ADDRESS],
+            self.memory[WY_ADDRESS],
+        ]
+        return [line] * SCREEN_HEIGHT
+
+    def get_tilemap_position(self) -> tuple[tuple[int, int], tuple[int, int]]:
+        return (
+            (self.memory[SCX_ADDRESS], self.memory[SCY_ADDRESS]),
+            (self.memory[WX_ADDRESS] - 7, self.memory[WY_ADDRESS]),
+        )
+
+
+class FakeSprite:
+    def __init__(self, oam: np.ndarray) -> None:
+        self.y = int(oam[0]) - 16
+        self.x = int(oam[1]) - 8
+        self.tile_identifier = int(oam[2])
+        self.on_screen = -16 < self.y < SCREEN_HEIGHT and -8 < self.x < SCREEN_WIDTH
+
+
+class FakeGameWrapper:
+    # Super Mario Land wrapper: background game area with sprites overlaid and
+    # the score read from the top of the screen
+    mapping_compressed = mapping_compressed
+    game_area_section = (0, 2, 20, 16)
+    blank_tile = 300
+
+    def __init__(self, fake: "FakePyBoy") -> None:
+        self.fake = fake
+        self.mapping = np.arange(384, dtype=np.uint32)
+        self.sprite_offset = 0
+
+    def game_area_mapping(self, mapping, sprite_offset: int) -> None:
+        self.mapping = np.asarray(mapping, dtype=np.uint32)
+        self.sprite_offset = sprite_offset
+
+    @property
+    def score(self) -> int:
+        digits = tm.read_background_tilemap(self.fake.memory)[1, 0:6]
+        score = 0
+        for digit in digits:
+            score *= 10
+            if digit != self.blank_tile:
+                score += int(digit) - 256
+        return score
+
+    def game_area(self) -> np.ndarray:
+        x, y, width, height = self.game_area_section
+        (scx, scy), _ = self.fake.screen.get_tilemap_position()
+        rows, columns = tm.window_indices(
+            scx, scy, tm.SCREEN_ROWS[y : y + height], tm.SCREEN_COLUMNS[x : x + width]
+        )
+        tiles = self.mapping[
+            tm.read_background_tilemap(self.fake.memory)[rows, columns]
+        ]
+
+        for index in range(SPRITE_COUNT):
+            sprite = self.fake.get_sprite(index)
+            if not sprite.on_screen:
+                continue
+            row = sprite.y // 8 - y
+            column = sprite.x // 8 - x
+            if 0 <= row < height and 0 <= column < width:
+                tiles[row, column] = (
+                    self.mapping[sprite.tile_identifier] + self.sprite_offset
+                )
+        return tiles
+
+
+class FakePyBoy:
+    """
+    Replays snapshots of the full 64KB address space, one every interval frames.
+
+    Without snapshots memory starts zeroed. script is called with the fake
+    after every tick and can write RAM, the screen or anything else to drive
+    a scenario. Inputs are only recorded, they do not affect the replay.
+    """
+
+    def __init__(
+        self,
+        snapshots: np.ndarray = None,
+        interval: int = 1,
+        screens: np.ndarray = None,
+        script: Callable[["FakePyBoy"], None] = None,
+        loop: bool = True,
+    ) -> None:
+        if snapshots is None:
+            snapshots = np.zeros((1, MEMORY_SIZE), dtype=np.uint8)
+        self.snapshots = np.asarray(snapshots, dtype=np.uint8)
+        self.interval = interval
+        self.screens = screens
+        self.script = script
+        self.loop = loop
+
+        self.memory = FakeMemory()
+        self.screen = FakeScreen(self.memory)
+        self.game_wrapper = FakeGameWrapper(self)
+        self.inputs = []
+
+        self.frame_count = 0
+        self._show_frame(0)
+        self._initial_state = self._save_bytes()
+
+    @classmethod
+    def from_recording(cls, path: str, **kwargs) -> "FakePyBoy":
+        recording = np.load(path)
+        screens = recording["screens"] if "screens" in recording else None
+        return cls(
+            recording["snapshots"],
+            int(recording["interval"]),
+            screens=screens,
+            **kwargs,
+        )
+
+    def initial_state(self) -> bytes:
+        # Stands in for the task's init state file
+        return self._initial_state
+
+    def tick(self, count: int = 1, render: bool = True) -> bool:
+        self.frame_count += count
+        self._show_frame(self.frame_count // self.interval)
+        if self.script is not None:
+            self.script(self)
+        return True
+
+    def send_input(self, event) -> None:
+        self.inputs.append(event)
+
+    def get_sprite(self, index: int) -> FakeSprite:
+        start = OAM_ADDRESS + index * 4
+        return FakeSprite(self.memory.array[start : start + 4])
+
+    def game_area(self) -> np.ndarray:
+        return self.game_wrapper.game_area()
+
+    def save_state(self, file_like_object) -> None:
+        np.savez(
+            file_like_object,
+            frame_count=self.frame_count,
+            memory=self.memory.array,
+            screen=self.screen.ndarray,
+        )
+
+    def load_state(self, file_like_object) -> None:
+        state = np.load(file_like_object)
+        self.frame_count = int(state["frame_count"])
+        self.memory.array[:] = state["memory"]
+        self.screen.ndarray[:] = state["screen"]
+
+    def set_emulation_speed(self, target_speed: int) -> None:
+        pass
+
+    def stop(self, save: bool = True) -> None:
+        pass
+
+    def _show_frame(self, index: int) -> None:
+        count = len(self.snapshots)
+        index = index % count if self.loop else min(index, count - 1)
+        self.memory.array[:] = self.snapshots[index]
+        if self.screens is not None:
+            self.screen.ndarray[:] = self.screens[index]
+
+    def _save_bytes(self) -> bytes:
+        with io.BytesIO() as f:
+            self.save_state(f)
+            return f.getvalue()
+
+
+def record(
+    pyboy,
+    path: str,
+    frames: int,
+    interval: int = 1,
+    screens: bool = False,
+    inputs: Callable[[int], list] = None,
+) -> None:
+    # Records a real PyBoy for FakePyBoy.from_recording. inputs(frame) returns
+    # the events to send before that frame is emulated
+    snapshots = []
+    frames_recorded = []
+    for frame in range(frames):
+        if frame % interval == 0:
+            snapshots.append(np.array(pyboy.memory[0:MEMORY_SIZE], dtype=np.uint8))
+            if screens:
+                frames_recorded.append(pyboy.screen.ndarray.copy())
+        if inputs is not None:
+            for event in inputs(frame):
+                pyboy.send_input(event)
+        pyboy.tick(1, screens)
+
+    arrays = {"snapshots": np.stack(snapshots), "interval": interval}
+    if screens:
+        arrays["screens"] = np.stack(frames_recorded)
+    np.savez_compressed(path, **arrays)
+
+
+class FakeBackend:
+    # Backend for PyboyEnvironment, called with the ROM path and window. A class
+    # rather than a closure so it can be pickled to worker processes
+
+    def __init__(self, recording_path: str = None, **kwargs) -> None:
+        self.recording_path = recording_path
+        self.kwargs = kwargs
+
+    def __call__(self, rom_path: str, window: str = "null") -> FakePyBoy:
+        if self.recording_path is None:
+            return FakePyBoy(**self.kwargs)
+        return FakePyBoy.from_recording(self.recording_path, **self.kwargs)
+
+
+def fake_backend(recording_path: str = None, **kwargs) -> FakeBackend:
+    return FakeBackend(recording_path, **kwargs)
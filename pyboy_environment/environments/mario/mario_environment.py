@@ -1,5 +1,5 @@
 """
-The link below has all the ROM memory data for Super Mario Land. 
+The link below has all the ROM memory data for Super Mario Land.
 It is used to extract the game state for the MarioEnvironment class.
 
 https://datacrystal.tcrf.net/wiki/Super_Mario_Land/RAM_map
@@ -9,11 +9,30 @@ https://github.com/lixado/PyBoy-RL/blob/main/AISettings/MarioAISettings.py
 """
 
 from abc import ABCMeta
+from typing import Callable
 
 import numpy as np
+from pyboy.plugins.game_wrapper_super_mario_land import mapping_compressed
 from pyboy.utils import WindowEvent
 
+from pyboy_environment.environments.observation import (
+    ObservationField,
+    ObservationLayout,
+    ObservationWriter,
+)
+from pyboy_environment.environments.pixels import PixelObservation
 from pyboy_environment.environments.pyboy_environment import PyboyEnvironment
+from pyboy_environment.environments.tile_grid import TileGridObservation
+
+# Tiles through the wrapper's compressed mapping, which is a uint8 table
+MARIO_OBSERVATION = ObservationLayout([ObservationField("game_area", (16, 20), 0, 255)])
+
+
+def mario_tile_grid(**kwargs) -> TileGridObservation:
+    # Same band and compressed tiles as game_area, below the HUD
+    return TileGridObservation(
+        vocabulary=mapping_compressed, first_row=2, rows=16, **kwargs
+    )
 
 
 class MarioEnvironment(PyboyEnvironment, metaclass=ABCMeta):
@@ -24,7 +43,12 @@ class MarioEnvironment(PyboyEnvironment, metaclass=ABCMeta):
         release_button: list[WindowEvent],
         emulation_speed: int = 0,
         headless: bool = False,
+        backend: Callable = None,
+        observation_dtype: np.dtype = np.float64,
+        pixels: PixelObservation = None,
+        tile_grid: TileGridObservation = None,
     ) -> None:
+        self.observation = ObservationWriter(MARIO_OBSERVATION, dtype=observation_dtype)
 
         super().__init__(
             task="mario",
@@ -36,12 +60,16 @@ class MarioEnvironment(PyboyEnvironment, metaclass=ABCMeta):
             release_button=release_button,
             emulation_speed=emulation_speed,
             headless=headless,
+            backend=backend,
+            pixels=pixels,
+            tile_grid=tile_grid,
         )
 
     def _get_state(self) -> np.ndarray:
         # TODO parameter as to whether to flatten this view or not
         # TODO image based being frame or game area frame...
-        return self.game_area().flatten().tolist()
+        self.observation["game_area"][:] = self.game_area()
+        return self.observation.output()
 
     def _generate_game_stats(self) -> dict[str, int]:
         return {
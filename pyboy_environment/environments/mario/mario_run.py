@@ -1,11 +1,13 @@
 import logging
 from functools import cached_property
-from typing import Dict, List
+from typing import Callable, Dict, List
 
 import numpy as np
 from pyboy.utils import WindowEvent
 
 from pyboy_environment.environments.mario.mario_environment import MarioEnvironment
+from pyboy_environment.environments.pixels import PixelObservation
+from pyboy_environment.environments.tile_grid import TileGridObservation
 
 
 class MarioRun(MarioEnvironment):
@@ -14,6 +16,10 @@ class MarioRun(MarioEnvironment):
         act_freq: int,
         emulation_speed: int = 0,
         headless: bool = False,
+        backend: Callable = None,
+        observation_dtype: np.dtype = np.float64,
+        pixels: PixelObservation = None,
+        tile_grid: TileGridObservation = None,
     ) -> None:
 
         valid_actions: List[WindowEvent] = [
@@ -40,6 +46,10 @@ class MarioRun(MarioEnvironment):
             release_button=release_button,
             emulation_speed=emulation_speed,
             headless=headless,
+            backend=backend,
+            observation_dtype=observation_dtype,
+            pixels=pixels,
+            tile_grid=tile_grid,
         )
 
         self.max_level_progress = 0
@@ -48,6 +58,15 @@ class MarioRun(MarioEnvironment):
         self.max_level_progress = 0
         return super().reset()
 
+    def _get_episode_state(self) -> dict:
+        episode_state = super()._get_episode_state()
+        episode_state["max_level_progress"] = self.max_level_progress
+        return episode_state
+
+    def _set_episode_state(self, episode_state: dict) -> None:
+        super()._set_episode_state(episode_state)
+        self.max_level_progress = episode_state["max_level_progress"]
+
     @cached_property
     def min_action_value(self) -> float:
         return 0
@@ -57,7 +76,11 @@ class MarioRun(MarioEnvironment):
         return 1
 
     @cached_property
-    def observation_space(self) -> int:
+    def observation_space(self) -> int | tuple[int, ...]:
+        if self.pixels is not None:
+            return self.pixels.shape
+        if self.tile_grid is not None:
+            return self.tile_grid.shape
         return len(self._get_state())
 
     @cached_property
@@ -78,8 +101,7 @@ class MarioRun(MarioEnvironment):
             else:
                 self.pyboy.send_input(self.release_button[i])
 
-        for i in range(self.act_freq):
-            self.pyboy.tick()
+        self._tick(self.act_freq)
 
     def _calculate_reward(self, new_state: Dict[str, int]) -> float:
         reward_stats = {
@@ -0,0 +1,150 @@
+# Fixed layout observation vectors written in place into one preallocated array
+
+from typing import NamedTuple
+
+import numpy as np
+
+OBSERVATION_DTYPES = tuple(
+    np.dtype(dtype)
+    for dtype in (np.uint8, np.int16, np.float16, np.float32, np.float64)
+)
+
+# Fractions are stored as whole percentages in integer observations
+FRACTION_SCALE = 100
+
+
+class ObservationField(NamedTuple):
+    name: str
+    shape: tuple[int, ...]
+    # Declared range of the values written to the field
+    low: float
+    high: float
+    fraction: bool = False
+
+
+class ObservationLayout:
+    def __init__(self, fields: list[ObservationField]) -> None:
+        # fields are in the order they appear in the flat vector
+        self.fields: dict[str, ObservationField] = {}
+        self.shapes: dict[str, tuple[int, ...]] = {}
+        self.slices: dict[str, slice] = {}
+
+        offset = 0
+        for field in fields:
+            shape = tuple(field.shape)
+            size = int(np.prod(shape))
+            self.fields[field.name] = field
+            self.shapes[field.name] = shape
+            self.slices[field.name] = slice(offset, offset + size)
+            offset += size
+        self.size = offset
+
+    def scale(self, name: str, dtype: np.dtype) -> int:
+        # Factor applied to a field's values when written with dtype
+        if self.fields[name].fraction and np.dtype(dtype).kind in "iu":
+            return FRACTION_SCALE
+        return 1
+
+    def validate(self, dtype: np.dtype) -> np.dtype:
+        dtype = np.dtype(dtype)
+        if dtype not in OBSERVATION_DTYPES:
+            raise ValueError(
+                f"Observation dtype must be one of {[str(d) for d in OBSERVATION_DTYPES]}, got {dtype}"
+            )
+
+        if dtype.kind in "iu":
+            info = np.iinfo(dtype)
+            lowest, highest, exact = info.min, info.max, info.max
+        else:
+            info = np.finfo(dtype)
+            # Largest magnitude below which every integer is exact
+            lowest, highest, exact = (
+                float(info.min),
+                float(info.max),
+                2 ** (info.nmant + 1),
+            )
+
+        unfit = []
+        for name, field in self.fields.items():
+            scale = self.scale(name, dtype)
+            low, high = field.low * scale, field.high * scale
+            if low < lowest or high > highest:
+                unfit.append(f"{name} [{field.low}, {field.high}]")
+            elif not field.fraction and max(abs(low), abs(high)) > exact:
+                unfit.append(f"{name} [{field.low}, {field.high}] loses precision")
+        if unfit:
+            raise ValueError(
+                f"Observation fields do not fit {dtype}: {', '.join(unfit)}"
+            )
+        return dtype
+
+    def schema(self, dtype: np.dtype) -> dict[str, any]:
+        dtype = np.dtype(dtype)
+        return {
+            "dtype": str(dtype),
+            "size": self.size,
+            "fields": {
+                name: {
+                    "start": self.slices[name].start,
+                    "stop": self.slices[name].stop,
+                    "shape": self.shapes[name],
+                    "low": field.low,
+                    "high": field.high,
+                    "scale": self.scale(name, dtype),
+                }
+                for name, field in self.fields.items()
+            },
+        }
+
+    def allocate(self, dtype: np.dtype = np.float64) -> np.ndarray:
+        return np.zeros(self.size, dtype=dtype)
+
+    def field(self, observation: np.ndarray, name: str) -> np.ndarray:
+        # Reshaped view of one field of a flat observation
+        return observation[self.slices[name]].reshape(self.shapes[name])
+
+
+class ObservationWriter:
+    """
+    Writes observations of a layout into a single reusable buffer.
+
+    Every field is a view into the buffer, so filling the fields fills the
+    observation without temporaries. out can be any 1D array of the layout's
+    size, e.g. a row of a vector environment's shared memory. With copy False
+    output returns the buffer itself, which the next observation overwrites.
+
+    dtype is checked against the fields' declared ranges. Fraction fields are
+    multiplied by scales[name] before writing, which is FRACTION_SCALE for
+    integer dtypes and 1 otherwise.
+    """
+
+    def __init__(
+        self,
+        layout: ObservationLayout,
+        dtype: np.dtype = np.float64,
+        copy: bool = True,
+        out: np.ndarray = None,
+    ) -> None:
+        self.layout = layout
+        self.copy = copy
+        self.dtype = layout.validate(dtype if out is None else out.dtype)
+        self.scales = {name: layout.scale(name, self.dtype) for name in layout.fields}
+        self.buffer = layout.allocate(self.dtype) if out is None else out
+        if self.buffer.shape != (layout.size,):
+            raise ValueError(
+                f"out must have shape {(layout.size,)}, got {self.buffer.shape}"
+            )
+        self.fields = {name: layout.field(self.buffer, name) for name in layout.slices}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.fields[name]
+
+    def scaled(self, name: str, value: float) -> float:
+        scale = self.scales[name]
+        return value if scale == 1 else round(value * scale)
+
+    def schema(self) -> dict[str, any]:
+        return self.layout.schema(self.dtype)
+
+    def output(self) -> np.ndarray:
+        return self.buffer.copy() if self.copy else self.buffer
@@ -0,0 +1,85 @@
+# Pixel observations straight from the screen's RGBA buffer, no PIL round trip
+
+import cv2
+import numpy as np
+
+SCREEN_HEIGHT = 144
+SCREEN_WIDTH = 160
+
+
+class PixelObservation:
+    """
+    Stack of the last stack screens as uint8 (stack, height, width[, 3]).
+
+    Frames are converted and block averaged by an integer factor with OpenCV
+    directly into the slot of a preallocated ring buffer, observation() then
+    orders the ring oldest to newest into a second reused buffer. With copy
+    False the returned array is that buffer and is overwritten by the next step.
+    """
+
+    def __init__(
+        self,
+        downsample: int = 2,
+        stack: int = 4,
+        grayscale: bool = True,
+        copy: bool = True,
+    ) -> None:
+        if SCREEN_HEIGHT % downsample or SCREEN_WIDTH % downsample:
+            raise ValueError(
+                f"downsample must divide the {SCREEN_WIDTH}x{SCREEN_HEIGHT} screen, got {downsample}"
+            )
+
+        self.downsample = downsample
+        self.stack = stack
+        self.grayscale = grayscale
+        self.copy = copy
+
+        self.height = SCREEN_HEIGHT // downsample
+        self.width = SCREEN_WIDTH // downsample
+        channels = () if grayscale else (3,)
+        self.shape = (stack, self.height, self.width, *channels)
+
+        self.frames = np.zeros(self.shape, dtype=np.uint8)
+        self._output = np.zeros(self.shape, dtype=np.uint8)
+        # Full resolution conversion, only needed when downsampling
+        self._converted = np.zeros((SCREEN_HEIGHT, SCREEN_WIDTH, *channels), np.uint8)
+        self._conversion = cv2.COLOR_RGBA2GRAY if grayscale else cv2.COLOR_RGBA2RGB
+        self._order = np.arange(stack)
+        self._next = 0
+
+    def reset(self, screen: np.ndarray) -> np.ndarray:
+        # A new episode starts with every slot holding its first frame
+        self._write(screen, 0)
+        self.frames[1:] = self.frames[0]
+        self._next = 1 % self.stack
+        return self.observation()
+
+    def push(self, screen: np.ndarray) -> np.ndarray:
+        self._write(screen, self._next)
+        self._next = (self._next + 1) % self.stack
+        return self.observation()
+
+    def observation(self) -> np.ndarray:
+        # Oldest first - the slot written next holds the oldest frame
+        np.take(
+            self.frames,
+            (self._order + self._next) % self.stack,
+            axis=0,
+            out=self._output,
+        )
+        return self._output.copy() if self.copy else self._output
+
+    def _write(self, screen: np.ndarray, index: int) -> None:
+        slot = self.frames[index]
+        if self.downsample == 1:
+            cv2.cvtColor(screen, self._conversion, dst=slot)
+            return
+
+        cv2.cvtColor(screen, self._conversion, dst=self._converted)
+        # INTER_AREA with an integer factor is the mean of each block
+        cv2.resize(
+            self._converted,
+            (self.width, self.height),
+            dst=slot,
+            interpolation=cv2.INTER_AREA,
+        )
@@ -0,0 +1,113 @@
+# Go-Explore style archive of emulator snapshots for Pokemon exploration
+# https://arxiv.org/abs/1901.10995
+
+import math
+import pickle
+import random
+import zlib
+
+from pyboy_environment.environments.pyboy_environment import Snapshot
+
+
+class Cell:
+    def __init__(self, emulator_state: bytes, episode_state: dict) -> None:
+        self.emulator_state = emulator_state
+        self.episode_state = episode_state
+        self.seen = 1
+        self.chosen = 0
+
+    @property
+    def visits(self) -> int:
+        return self.seen + self.chosen
+
+    @property
+    def weight(self) -> float:
+        # Count based weighting - rarely visited cells are the frontier
+        return 1.0 / math.sqrt(self.visits)
+
+
+class CellArchive:
+    def __init__(
+        self,
+        max_cells: int = 2000,
+        level_bucket_size: int = 5,
+        seed: int = None,
+    ) -> None:
+        self.max_cells = max_cells
+        self.level_bucket_size = level_bucket_size
+        self.cells: dict[tuple, Cell] = {}
+        # (seen, chosen) of evicted cells, so they do not come back as novel
+        self.evicted: dict[tuple, tuple[int, int]] = {}
+        self._random = random.Random(seed)
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def cell_key(self, game_stats: dict) -> tuple:
+        location = game_stats["location"]
+        return (
+            location["map_id"],
+            location["x"],
+            location["y"],
+            sum(game_stats["levels"]) // self.level_bucket_size,
+            game_stats["badges"],
+        )
+
+    def observe(self, game_stats: dict, snapshot_fn) -> bool:
+        # snapshot_fn is only called for new cells, returns True if one was added
+        key = self.cell_key(game_stats)
+        cell = self.cells.get(key)
+        if cell is not None:
+            cell.seen += 1
+            return False
+
+        seen, chosen = self.evicted.get(key, (0, 0))
+        seen += 1
+        if len(self.cells) >= self.max_cells:
+            # Drop the most visited cell, it is the least likely to be chosen,
+            # unless the returning cell would be visited even more
+            evict_key = max(self.cells, key=lambda k: self.cells[k].visits)
+            if seen + chosen >= self.cells[evict_key].visits:
+                self.evicted[key] = (seen, chosen)
+                return False
+            self._evict(evict_key)
+        self.evicted.pop(key, None)
+
+        # Savestates are mostly zeros, compressing keeps the archive small
+        snapshot = snapshot_fn()
+        cell = Cell(zlib.compress(snapshot.emulator_state, 1), snapshot.episode_state)
+        cell.seen = seen
+        cell.chosen = chosen
+        self.cells[key] = cell
+        return True
+
+    def select(self) -> Snapshot:
+        cells = list(self.cells.values())
+        cell = self._random.choices(cells, weights=[c.weight for c in cells])[0]
+        cell.chosen += 1
+        return Snapshot(zlib.decompress(cell.emulator_state), cell.episode_state)
+
+    def _evict(self, key: tuple) -> None:
+        cell = self.cells.pop(key)
+        self.evicted[key] = (cell.seen, cell.chosen)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            pickle.dump(
+                {
+                    "max_cells": self.max_cells,
+                    "level_bucket_size": self.level_bucket_size,
+                    "cells": self.cells,
+                    "evicted": self.evicted,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path: str, seed: int = None) -> "CellArchive":
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        archive = cls(data["max_cells"], data["level_bucket_size"], seed=seed)
+        archive.cells = data["cells"]
+        archive.evicted = data.get("evicted", {})
+        return archive
@@ -0,0 +1,85 @@
+# Walkable tile lookup for the Pokemon Red overworld.
+#
+# https://github.com/pret/pokered/blob/91dc3c9f9c8fd529bb6e8307b58b96efa0bec67e/data/tilesets/collision_tile_ids.asm
+
+import numpy as np
+
+from pyboy_environment.environments import tilemap as tm
+from pyboy_environment.environments.pokemon import pokemon_memory as pkm
+
+TILE_ID_COUNT = 0x200
+COLLISION_LIST_LENGTH = 0x180
+COLLISION_LIST_END = 0xFF
+
+# The walkable matrix samples the bottom left tile of each 16x16 block
+BLOCK_ROWS = tm.SCREEN_ROWS[1::2]
+BLOCK_COLUMNS = tm.SCREEN_COLUMNS[::2]
+BLOCK_SIZE = 16
+# Sprites are drawn 4 pixels above the grid to look centred on their block
+SPRITE_Y_OFFSET = 4
+
+
+def sprite_matrix(
+    sprites: np.ndarray, include_player: bool = False, out: np.ndarray = None
+) -> np.ndarray:
+    # 9x10 block grid with 1 where a visible sprite stands, sprites is read_sprites output
+    if out is None:
+        out = np.zeros((len(BLOCK_ROWS), len(BLOCK_COLUMNS)), dtype=np.uint8)
+    else:
+        out[:] = 0
+
+    visible = (sprites["picture_id"] != 0) & (
+        sprites["image_index"] != pkm.SPRITE_HIDDEN
+    )
+    if not include_player:
+        visible[0] = False
+
+    rows = (sprites["screen_y"].astype(np.int16) + SPRITE_Y_OFFSET) // BLOCK_SIZE
+    columns = sprites["screen_x"].astype(np.int16) // BLOCK_SIZE
+    visible &= (rows < out.shape[0]) & (columns < out.shape[1])
+    out[rows[visible], columns[visible]] = 1
+    return out
+
+
+class CollisionEngine:
+    def __init__(self) -> None:
+        # Collision lists live in ROM, so a table only depends on this key
+        self._walkable_tables: dict[tuple[int, int, int], np.ndarray] = {}
+
+    def walkable_table(
+        self, memory, collision_ptr: int, tileset_type: int, grass_tile: int
+    ) -> np.ndarray:
+        key = (collision_ptr, tileset_type, grass_tile)
+        table = self._walkable_tables.get(key)
+        if table is None:
+            table = self._build_walkable_table(
+                memory, collision_ptr, tileset_type, grass_tile
+            )
+            self._walkable_tables[key] = table
+        return table
+
+    def _build_walkable_table(
+        self, memory, collision_ptr: int, tileset_type: int, grass_tile: int
+    ) -> np.ndarray:
+        table = np.zeros(TILE_ID_COUNT, dtype=bool)
+
+        if tileset_type > 0 and grass_tile != COLLISION_LIST_END:
+            table[grass_tile + 0x100] = True
+
+        end = min(collision_ptr + COLLISION_LIST_LENGTH, 0x10000)
+        tiles = np.array(memory[collision_ptr:end], dtype=np.uint16)
+        terminators = np.flatnonzero(tiles == COLLISION_LIST_END)
+        if len(terminators) > 0:
+            tiles = tiles[: terminators[0]]
+        table[tiles + 0x100] = True
+
+        table.flags.writeable = False
+        return table
+
+    def walkable_matrix(
+        self, table: np.ndarray, tilemap: np.ndarray, scx: int, scy: int
+    ) -> np.ndarray:
+        rows, columns = tm.window_indices(
+            scx, scy, BLOCK_ROWS, BLOCK_COLUMNS, round_up=True
+        )
+        return table[tilemap[rows, columns]].view(np.uint8)
@@ -0,0 +1,32 @@
+# Count based novelty tracking on packed integer location keys
+
+
+def location_key(location: dict) -> int:
+    # map_id, y and x are single bytes in WRAM, so the key is unique per tile
+    return location["map_id"] << 16 | location["y"] << 8 | location["x"]
+
+
+class VisitCounter:
+    def __init__(self, counts: dict[int, int] = None) -> None:
+        self.counts: dict[int, int] = dict(counts) if counts else {}
+
+    def __contains__(self, key: int) -> bool:
+        return key in self.counts
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def visit(self, key: int) -> int:
+        # Returns the visit count including this one, 1 means the key is new
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        return count
+
+    def count(self, key: int) -> int:
+        return self.counts.get(key, 0)
+
+    def clear(self) -> None:
+        self.counts.clear()
+
+    def copy(self) -> "VisitCounter":
+        return VisitCounter(self.counts)
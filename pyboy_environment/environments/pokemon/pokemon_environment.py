@@ -1,12 +1,38 @@
 import random
 from functools import cached_property
+from typing import Callable
 from abc import abstractmethod
 
 import numpy as np
 from pyboy.utils import WindowEvent
 
+from pyboy_environment.environments import bitfield
+from pyboy_environment.environments import tilemap as tm
+from pyboy_environment.environments.pixels import PixelObservation
 from pyboy_environment.environments.pyboy_environment import PyboyEnvironment
+from pyboy_environment.environments.tile_grid import TILE_ID_COUNT, TileGridObservation
 from pyboy_environment.environments.pokemon import pokemon_constants as pkc
+from pyboy_environment.environments.pokemon import pokemon_memory as pkm
+from pyboy_environment.environments.pokemon import collision
+from pyboy_environment.environments.pokemon.collision import CollisionEngine
+
+# Tile classes from the VRAM layout, the background always uses the signed
+# 0x8800 tile data so unified tile ids 0-127 are only ever sprites
+# https://github.com/pret/pokered/blob/91dc3c9f9c8fd529bb6e8307b58b96efa0bec67e/ram/vram.asm
+# https://github.com/pret/pokered/blob/91dc3c9f9c8fd529bb6e8307b58b96efa0bec67e/constants/charmap.asm
+POKEMON_VOCABULARY = np.zeros(TILE_ID_COUNT, dtype=np.uint8)
+# vChars2: the map's tileset, then the text box frame from tile 0x60
+POKEMON_VOCABULARY[256:384] = np.arange(1, 129)
+# vFont: every glyph is text, only the menu cursors ▷ ▶ ▼ are told apart
+POKEMON_VOCABULARY[128:256] = 129
+POKEMON_VOCABULARY[[0xEC, 0xED, 0xEE]] = [130, 131, 132]
+# vSprites: marks where the player or an NPC stands, like the sprite matrix
+POKEMON_VOCABULARY[0:128] = 133
+
+
+def pokemon_tile_grid(**kwargs) -> TileGridObservation:
+    # The whole screen as a uint8 grid of POKEMON_VOCABULARY classes
+    return TileGridObservation(vocabulary=POKEMON_VOCABULARY, **kwargs)
 
 
 class PokemonEnvironment(PyboyEnvironment):
@@ -19,7 +45,12 @@ class PokemonEnvironment(PyboyEnvironment):
         emulation_speed: int = 0,
         headless: bool = False,
         init_name: str = "has_pokedex.state",
+        backend: Callable = None,
+        pixels: PixelObservation = None,
+        tile_grid: TileGridObservation = None,
     ) -> None:
+        self.collision = CollisionEngine()
+
         super().__init__(
             task=task,
             rom_name="PokemonRed.gb",
@@ -30,6 +61,9 @@ class PokemonEnvironment(PyboyEnvironment):
             valid_actions=valid_actions,
             release_button=release_button,
             headless=headless,
+            backend=backend,
+            pixels=pixels,
+            tile_grid=tile_grid,
         )
 
     @cached_property
@@ -41,7 +75,11 @@ class PokemonEnvironment(PyboyEnvironment):
         return 1
 
     @cached_property
-    def observation_space(self) -> int:
+    def observation_space(self) -> int | tuple[int, ...]:
+        if self.pixels is not None:
+            return self.pixels.shape
+        if self.tile_grid is not None:
+            return self.tile_grid.shape
         return len(self._get_state())
 
     @cached_property
@@ -71,31 +109,59 @@ class PokemonEnvironment(PyboyEnvironment):
         # Push the button for a few frames
         self.pyboy.send_input(self.valid_actions[button])
 
-        for _ in range(self.act_freq):
-            self.pyboy.tick()
+        self._tick(self.act_freq)
 
         # Release the button
         self.pyboy.send_input(self.release_button[button])
 
+    def _read_wram(self) -> np.void:
+        return self._frame_cached("wram", lambda: pkm.read_wram(self.pyboy.memory))
+
     def _generate_game_stats(self) -> dict[str, any]:
+        # Single bulk read of WRAM - every field below is decoded from this view
+        wram = self._read_wram()
+        party_ids = self._read_party_id(wram)
+        party_types = self._read_party_type(wram)
         return {
-            "location": self._get_location(),
-            "party_size": self._get_party_size(),
-            "ids": self._read_party_id(),
-            "pokemon": [pkc.get_pokemon(id) for id in self._read_party_id()],
-            "levels": self._read_party_level(),
-            "type_id": self._read_party_type(),
-            "type": [pkc.get_type(id) for id in self._read_party_type()],
-            "hp": self._read_party_hp(),
-            "xp": self._read_party_xp(),
-            "status": self._read_party_status(),
-            "badges": self._get_badge_count(),
-            "caught_pokemon": self._read_caught_pokemon_count(),
-            "seen_pokemon": self._read_seen_pokemon_count(),
-            "money": self._read_money(),
-            "events": self._read_events(),
+            "location": self._get_location(wram),
+            "party_size": self._get_party_size(wram),
+            "ids": party_ids,
+            "pokemon": [pkc.get_pokemon(id) for id in party_ids],
+            "levels": self._read_party_level(wram),
+            "type_id": party_types,
+            "type": [pkc.get_type(id) for id in party_types],
+            "hp": self._read_party_hp(wram),
+            "xp": self._read_party_xp(wram),
+            "status": self._read_party_status(wram),
+            "badges": self._get_badge_count(wram),
+            "caught_pokemon": self._read_caught_pokemon_count(wram),
+            "seen_pokemon": self._read_seen_pokemon_count(wram),
+            "money": self._read_money(wram),
+            "events": self._read_events(wram),
         }
 
+    @property
+    def prior_game_stats(self) -> dict[str, any]:
+        return self._prior_game_stats
+
+    @prior_game_stats.setter
+    def prior_game_stats(self, game_stats: dict[str, any]) -> None:
+        # The event count is kept beside the stats rather than in them, the
+        # stats dict is written to results.json as is
+        self._prior_game_stats = game_stats
+        self._prior_event_count = self._event_count(game_stats)
+
+    def _event_count(self, game_stats: dict[str, any]) -> int:
+        # Counted straight from WRAM for this frame's stats, which step and
+        # reset always pass, and from the per-byte counts otherwise
+        current = (
+            self._cache_frame == self.pyboy.frame_count
+            and self._frame_cache.get("game_stats") is game_stats
+        )
+        if current:
+            return self._frame_cached("event_count", self._read_event_count)
+        return sum(game_stats["events"])
+
     @abstractmethod
     def _calculate_reward(self, new_state: dict) -> float:
         # Implement your reward calculation logic here
@@ -109,28 +175,52 @@ class PokemonEnvironment(PyboyEnvironment):
         # Implement your truncation check logic here
         return False
 
-    def _get_location(self) -> dict[str, any]:
-        x_pos = self._read_m(0xD362)
-        y_pos = self._read_m(0xD361)
-        map_n = self._read_m(0xD35E)
+    def _get_location(self, wram: np.void = None) -> dict[str, any]:
+        wram = self._read_wram() if wram is None else wram
+        map_n = int(wram["map_id"])
 
         return {
-            "x": x_pos,
-            "y": y_pos,
+            "x": int(wram["x"]),
+            "y": int(wram["y"]),
             "map_id": map_n,
             "map": pkc.get_map_location(map_n),
         }
 
-    def _get_party_size(self) -> int:
-        return self._read_m(0xD163)
+    def _get_party_size(self, wram: np.void = None) -> int:
+        wram = self._read_wram() if wram is None else wram
+        return int(wram["party_size"])
 
-    def _get_badge_count(self) -> int:
-        return self._bit_count(self._read_m(0xD356))
+    def _get_badge_count(self, wram: np.void = None) -> int:
+        wram = self._read_wram() if wram is None else wram
+        return int(bitfield.POPCOUNT_TABLE[wram["badges"]])
+
+    def _is_in_battle(self) -> bool:
+        return bool(self._read_wram()["battle_type"] != 0x00)
 
     def _is_grass_tile(self) -> bool:
-        grass_tile_index = self._read_m(0xD535)
-        player_sprite_status = self._read_m(0xC207)  # Assuming player is sprite 0
-        return player_sprite_status == 0x80
+        # Player is sprite 0
+        return bool(self._read_sprites()[0]["grass"] == 0x80)
+
+    def _read_sprites(self) -> np.ndarray:
+        # All 16 sprite slots, see pokemon_memory.sprite_dtype for the fields
+        return self._frame_cached(
+            "sprites", lambda: pkm.read_sprites(self.pyboy.memory)
+        )
+
+    def _get_screen_sprite_matrix(self) -> np.ndarray:
+        # 1 where an NPC or trainer stands on the 9x10 walkable grid
+        return self._frame_cached("sprite_matrix", self._read_screen_sprite_matrix)
+
+    def _read_screen_sprite_matrix(self) -> np.ndarray:
+        matrix = collision.sprite_matrix(self._read_sprites())
+        matrix.flags.writeable = False
+        return matrix
+
+    def _get_screen_obstacle_matrix(self) -> np.ndarray:
+        # Walkable matrix with the blocks occupied by sprites marked as blocked
+        return self._get_screen_walkable_matrix() & (
+            1 - self._get_screen_sprite_matrix()
+        )
 
     # in grass reward function that returns reward
     def _grass_reward(self, new_state: dict[str, any]) -> int:
@@ -138,136 +228,125 @@ class PokemonEnvironment(PyboyEnvironment):
             return 1
         return 0
 
-    def _read_party_id(self) -> list[int]:
+    def _read_party_id(self, wram: np.void = None) -> list[int]:
         # https://github.com/pret/pokered/blob/91dc3c9f9c8fd529bb6e8307b58b96efa0bec67e/constants/pokemon_constants.asm
-        return [
-            self._read_m(addr)
-            for addr in [0xD164, 0xD165, 0xD166, 0xD167, 0xD168, 0xD169]
-        ]
+        wram = self._read_wram() if wram is None else wram
+        return wram["party_ids"].tolist()
 
-    def _read_party_type(self) -> list[int]:
+    def _read_party_type(self, wram: np.void = None) -> list[int]:
         # https://github.com/pret/pokered/blob/91dc3c9f9c8fd529bb6e8307b58b96efa0bec67e/constants/type_constants.asm
-        return [
-            self._read_m(addr)
-            for addr in [
-                0xD170,
-                0xD171,
-                0xD19C,
-                0xD19D,
-                0xD1C8,
-                0xD1C9,
-                0xD1F4,
-                0xD1F5,
-                0xD220,
-                0xD221,
-                0xD24C,
-                0xD24D,
-            ]
-        ]
+        wram = self._read_wram() if wram is None else wram
+        return wram["party"]["type"].reshape(-1).tolist()
 
-    def _read_party_level(self) -> list[int]:
-        return [
-            self._read_m(addr)
-            for addr in [0xD18C, 0xD1B8, 0xD1E4, 0xD210, 0xD23C, 0xD268]
-        ]
+    def _read_party_level(self, wram: np.void = None) -> list[int]:
+        wram = self._read_wram() if wram is None else wram
+        return wram["party"]["level"].tolist()
 
-    def _read_party_status(self) -> list[int]:
+    def _read_party_status(self, wram: np.void = None) -> list[int]:
         # https://github.com/pret/pokered/blob/91dc3c9f9c8fd529bb6e8307b58b96efa0bec67e/constants/status_constants.asm
-        return [
-            self._read_m(addr)
-            for addr in [0xD16F, 0xD19B, 0xD1C7, 0xD1F3, 0xD21F, 0xD24B]
-        ]
+        wram = self._read_wram() if wram is None else wram
+        return wram["party"]["status"].tolist()
 
-    def _read_party_hp(self) -> dict[str, list[int]]:
-        hp = [
-            self._read_hp(addr)
-            for addr in [0xD16C, 0xD198, 0xD1C4, 0xD1F0, 0xD21C, 0xD248]
-        ]
-        max_hp = [
-            self._read_hp(addr)
-            for addr in [0xD18D, 0xD1B9, 0xD1E5, 0xD211, 0xD23D, 0xD269]
-        ]
-        return {"current": hp, "max": max_hp}
+    def _read_party_hp(self, wram: np.void = None) -> dict[str, list[int]]:
+        wram = self._read_wram() if wram is None else wram
+        party = wram["party"]
+        return {"current": party["hp"].tolist(), "max": party["max_hp"].tolist()}
 
-    def _read_party_xp(self) -> list[int]:
-        return [
-            self._read_triple(addr)
-            for addr in [0xD179, 0xD1A5, 0xD1D1, 0xD1FD, 0xD229, 0xD255]
-        ]
+    def _read_party_xp(self, wram: np.void = None) -> list[int]:
+        wram = self._read_wram() if wram is None else wram
+        return pkm.decode_triple(wram["party"]["xp"]).tolist()
 
     def _read_hp(self, start: int) -> int:
         return 256 * self._read_m(start) + self._read_m(start + 1)
 
-    def _read_caught_pokemon_count(self) -> int:
-        return sum(
-            list(self._bit_count(self._read_m(i)) for i in range(0xD2F7, 0xD30A))
-        )
+    def _read_caught_pokemon_count(self, wram: np.void = None) -> int:
+        wram = self._read_wram() if wram is None else wram
+        return bitfield.count_flags(wram["pokedex_owned"])
 
-    def _read_seen_pokemon_count(self) -> int:
-        return sum(
-            list(self._bit_count(self._read_m(i)) for i in range(0xD30A, 0xD31D))
-        )
+    def _read_seen_pokemon_count(self, wram: np.void = None) -> int:
+        wram = self._read_wram() if wram is None else wram
+        return bitfield.count_flags(wram["pokedex_seen"])
 
-    def _read_money(self) -> int:
-        return (
-            100 * 100 * self._read_bcd(self._read_m(0xD347))
-            + 100 * self._read_bcd(self._read_m(0xD348))
-            + self._read_bcd(self._read_m(0xD349))
-        )
+    def _read_caught_flags(self, wram: np.void = None) -> np.ndarray:
+        # Index n is set if pokedex number n + 1 has been caught
+        wram = self._read_wram() if wram is None else wram
+        return bitfield.unpack_flags(wram["pokedex_owned"])
+
+    def _read_seen_flags(self, wram: np.void = None) -> np.ndarray:
+        wram = self._read_wram() if wram is None else wram
+        return bitfield.unpack_flags(wram["pokedex_seen"])
+
+    def _read_money(self, wram: np.void = None) -> int:
+        wram = self._read_wram() if wram is None else wram
+        return pkm.decode_bcd(wram["money"])
 
-    def _read_events(self) -> list[int]:
-        event_flags_start = 0xD747
-        event_flags_end = 0xD886
+    def _read_events(self, wram: np.void = None) -> list[int]:
+        # Event flags live in 0xD747 - 0xD885, one count of set flags per byte
         # museum_ticket = (0xD754, 0)
         # base_event_flags = 13
-        return [
-            self._bit_count(self._read_m(i))
-            for i in range(event_flags_start, event_flags_end)
-        ]
+        wram = self._read_wram() if wram is None else wram
+        return bitfield.popcount(wram["events"]).tolist()
+
+    def _read_event_count(self, wram: np.void = None) -> int:
+        wram = self._read_wram() if wram is None else wram
+        return bitfield.count_flags(wram["events"])
+
+    def _read_event_flags(self, wram: np.void = None) -> np.ndarray:
+        # Raw event flags, index n is event flag n
+        wram = self._read_wram() if wram is None else wram
+        return bitfield.unpack_flags(wram["events"])
+
+    def _read_background_tilemap(self) -> np.ndarray:
+        return self._frame_cached(
+            "background_tilemap",
+            lambda: tm.read_background_tilemap(self.pyboy.memory),
+        )
 
     def _get_screen_background_tilemap(self):
         ### SIMILAR TO CURRENT pyboy.game_wrapper()._game_area_np(), BUT ONLY FOR BACKGROUND TILEMAP, SO NPC ARE SKIPPED
-       # bsm = self.pyboy.botsupport_manager()
         ((scx, scy), (wx, wy)) = self.pyboy.screen.get_tilemap_position()
-        tilemap = np.array(self.pyboy.tilemap_background[:, :])
-        return np.roll(np.roll(tilemap, -scy // 8, axis=0), -scx // 8, axis=1)[:18, :20]
+        return self._read_background_tilemap()[
+            tm.window_indices(scx, scy, round_up=True)
+        ]
 
     def _get_screen_walkable_matrix(self):
-        walkable_tiles_indexes = []
-        collision_ptr = self.pyboy.memory[0xD530] + (
-            self.pyboy.memory[0xD531] << 8
+        return self._frame_cached(
+            "walkable_matrix", self._read_screen_walkable_matrix
         )
-        tileset_type = self.pyboy.memory[0xFFD7]
-        if tileset_type > 0:
-            grass_tile_index = self.pyboy.memory[0xD535]
-            if grass_tile_index != 0xFF:
-                walkable_tiles_indexes.append(grass_tile_index + 0x100)
-        for i in range(0x180):
-            tile_index = self.pyboy.memory[collision_ptr + i]
-            if tile_index == 0xFF:
-                break
-            else:
-                walkable_tiles_indexes.append(tile_index + 0x100)
-        screen_tiles = self._get_screen_background_tilemap()
-        bottom_left_screen_tiles = screen_tiles[1 : 1 + screen_tiles.shape[0] : 2, ::2]
-        walkable_matrix = np.isin(
-            bottom_left_screen_tiles, walkable_tiles_indexes
-        ).astype(np.uint8)
-        return walkable_matrix
 
-    def game_area_collision(self):
-        shape = (20, 18)
-        game_area_section = (0, 0) + shape
-        width = game_area_section[2]
-        height = game_area_section[3]
+    def _read_screen_walkable_matrix(self):
+        wram = self._read_wram()
+        walkable_table = self.collision.walkable_table(
+            self.pyboy.memory,
+            int(wram["collision_ptr"]),
+            self._read_m(0xFFD7),
+            int(wram["grass_tile"]),
+        )
+        ((scx, scy), (wx, wy)) = self.pyboy.screen.get_tilemap_position()
+        walkable_matrix = self.collision.walkable_matrix(
+            walkable_table, self._read_background_tilemap(), scx, scy
+        )
+        walkable_matrix.flags.writeable = False
+        return walkable_matrix
 
-        game_area = np.ndarray(shape=(height, width), dtype=np.uint32)
-        _collision = self._get_screen_walkable_matrix()
-        for i in range(height // 2):
-            for j in range(width // 2):
-                game_area[i * 2][j * 2 : j * 2 + 2] = _collision[i][j]
-                game_area[i * 2 + 1][j * 2 : j * 2 + 2] = _collision[i][j]
-        return game_area
+    def game_area_collision(
+        self, out: np.ndarray = None, dtype: np.dtype = np.uint32
+    ) -> np.ndarray:
+        # Upsamples the 9x10 walkable matrix to the 18x20 screen tile grid.
+        # A new array is returned unless out is given to be written into
+        if out is None:
+            out = np.empty((tm.SCREEN_TILE_ROWS, tm.SCREEN_TILE_COLUMNS), dtype=dtype)
+        elif out.shape != (tm.SCREEN_TILE_ROWS, tm.SCREEN_TILE_COLUMNS):
+            raise ValueError(
+                f"out must have shape {(tm.SCREEN_TILE_ROWS, tm.SCREEN_TILE_COLUMNS)}, got {out.shape}"
+            )
+        elif not out.flags.c_contiguous:
+            raise ValueError("out must be C-contiguous")
+
+        collision = self._get_screen_walkable_matrix()
+        rows, columns = collision.shape
+        out.reshape(rows, 2, columns, 2)[...] = collision[:, None, :, None]
+        return out
 
     # Note: These are all examples of rewards we can calculate based on the stats, you can implement and modify your own as you please
 
@@ -295,4 +374,4 @@ class PokemonEnvironment(PyboyEnvironment):
         return new_state["money"] - self.prior_game_stats["money"]
 
     def _event_reward(self, new_state: dict[str, any]) -> int:
-        return sum(new_state["events"]) - sum(self.prior_game_stats["events"])
+        return self._event_count(new_state) - self._prior_event_count
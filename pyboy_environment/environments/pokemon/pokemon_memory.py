@@ -0,0 +1,180 @@
+# https://github.com/pret/pokered/blob/91dc3c9f9c8fd529bb6e8307b58b96efa0bec67e/ram/wram.asm
+#
+# Structured numpy layout of the Pokemon Red work RAM block 0xD000-0xDFFF.
+# The block is read from the emulator once with a single bulk slice and every
+# field below is a zero-copy view into that buffer.
+
+import numpy as np
+
+WRAM_START = 0xD000
+WRAM_END = 0xE000
+
+PARTY_SIZE = 6
+PARTY_MON_SIZE = 0x2C
+POKEDEX_BYTES = 0x13
+
+
+def _offset(addr: int) -> int:
+    return addr - WRAM_START
+
+
+# https://github.com/pret/pokered/blob/91dc3c9f9c8fd529bb6e8307b58b96efa0bec67e/macros/ram.asm - party_struct
+# Offsets are relative to the start of the party struct (species byte)
+party_mon_dtype = np.dtype(
+    {
+        "names": ["species", "hp", "status", "type", "xp", "level", "max_hp"],
+        "formats": ["u1", ">u2", "u1", ("u1", (2,)), ("u1", (3,)), "u1", ">u2"],
+        "offsets": [0x00, 0x01, 0x04, 0x05, 0x0E, 0x21, 0x22],
+        "itemsize": PARTY_MON_SIZE,
+    }
+)
+
+wram_dtype = np.dtype(
+    {
+        "names": [
+            "battle_type",
+            "party_size",
+            "party_ids",
+            "party",
+            "pokedex_owned",
+            "pokedex_seen",
+            "money",
+            "badges",
+            "map_id",
+            "y",
+            "x",
+            "collision_ptr",
+            "grass_tile",
+            "events",
+        ],
+        "formats": [
+            "u1",
+            "u1",
+            ("u1", (PARTY_SIZE,)),
+            (party_mon_dtype, (PARTY_SIZE,)),
+            ("u1", (POKEDEX_BYTES,)),
+            ("u1", (POKEDEX_BYTES,)),
+            ("u1", (3,)),
+            "u1",
+            "u1",
+            "u1",
+            "u1",
+            "<u2",
+            "u1",
+            ("u1", (0xD886 - 0xD747,)),
+        ],
+        "offsets": [
+            _offset(0xD057),
+            _offset(0xD163),
+            _offset(0xD164),
+            _offset(0xD16B),
+            _offset(0xD2F7),
+            _offset(0xD30A),
+            _offset(0xD347),
+            _offset(0xD356),
+            _offset(0xD35E),
+            _offset(0xD361),
+            _offset(0xD362),
+            _offset(0xD530),
+            _offset(0xD535),
+            _offset(0xD747),
+        ],
+        "itemsize": WRAM_END - WRAM_START,
+    }
+)
+
+# https://github.com/pret/pokered/blob/91dc3c9f9c8fd529bb6e8307b58b96efa0bec67e/ram/wram.asm - wSpriteStateData1/2
+# 16 slots of 16 bytes in each table, slot 0 is the player. read_sprites lays
+# every slot out as its table 1 bytes followed by its table 2 bytes
+SPRITE_STATE_1 = 0xC100
+SPRITE_STATE_2 = 0xC200
+SPRITE_SLOTS = 16
+SPRITE_SLOT_SIZE = 0x10
+# Sprite image index of sprites that are not on screen
+SPRITE_HIDDEN = 0xFF
+
+sprite_dtype = np.dtype(
+    {
+        "names": [
+            "picture_id",
+            "movement_status",
+            "image_index",
+            "y_delta",
+            "screen_y",
+            "x_delta",
+            "screen_x",
+            "facing",
+            "walk_counter",
+            "map_y",
+            "map_x",
+            "movement",
+            "grass",
+            "image_base",
+        ],
+        "formats": [
+            "u1",
+            "u1",
+            "u1",
+            "i1",
+            "u1",
+            "i1",
+            "u1",
+            "u1",
+            "u1",
+            "u1",
+            "u1",
+            "u1",
+            "u1",
+            "u1",
+        ],
+        "offsets": [
+            0x00,
+            0x01,
+            0x02,
+            0x03,
+            0x04,
+            0x05,
+            0x06,
+            0x09,
+            SPRITE_SLOT_SIZE + 0x00,
+            SPRITE_SLOT_SIZE + 0x04,
+            SPRITE_SLOT_SIZE + 0x05,
+            SPRITE_SLOT_SIZE + 0x06,
+            SPRITE_SLOT_SIZE + 0x07,
+            SPRITE_SLOT_SIZE + 0x0E,
+        ],
+        "itemsize": 2 * SPRITE_SLOT_SIZE,
+    }
+)
+
+_TRIPLE_WEIGHTS = np.array([256 * 256, 256, 1], dtype=np.uint32)
+_BCD_WEIGHTS = np.array([100 * 100, 100, 1], dtype=np.uint32)
+
+
+def read_wram(memory) -> np.void:
+    raw = np.array(memory[WRAM_START:WRAM_END], dtype=np.uint8)
+    raw.flags.writeable = False
+    return raw.view(wram_dtype)[0]
+
+
+def read_sprites(memory) -> np.ndarray:
+    # Both tables in one slice, interleaved per slot so each record is one view
+    raw = np.array(
+        memory[SPRITE_STATE_1 : SPRITE_STATE_2 + SPRITE_SLOTS * SPRITE_SLOT_SIZE],
+        dtype=np.uint8,
+    )
+    slots = raw.reshape(2, SPRITE_SLOTS, SPRITE_SLOT_SIZE).transpose(1, 0, 2)
+    # The reshape copies into one contiguous record per slot
+    sprites = slots.reshape(SPRITE_SLOTS, -1).view(sprite_dtype)[:, 0]
+    sprites.flags.writeable = False
+    return sprites
+
+
+def decode_triple(data: np.ndarray) -> np.ndarray:
+    # Big endian 24 bit values, last axis holds the three bytes
+    return data.astype(np.uint32) @ _TRIPLE_WEIGHTS
+
+
+def decode_bcd(data: np.ndarray) -> int:
+    digits = 10 * (data >> 4).astype(np.uint32) + (data & 0x0F)
+    return int(digits @ _BCD_WEIGHTS)
@@ -1,12 +1,62 @@
+import copy
 from functools import cached_property
+from typing import Callable
 
 import numpy as np
 from pyboy.utils import WindowEvent
 
+from pyboy_environment.environments.observation import (
+    ObservationField,
+    ObservationLayout,
+    ObservationWriter,
+)
+from pyboy_environment.environments.pixels import PixelObservation
 from pyboy_environment.environments.pokemon.pokemon_environment import (
     PokemonEnvironment,
 )
 from pyboy_environment.environments.pokemon import pokemon_constants as pkc
+from pyboy_environment.environments.pokemon.cell_archive import CellArchive
+from pyboy_environment.environments.pokemon.novelty import VisitCounter, location_key
+from pyboy_environment.environments.tile_grid import TileGridObservation
+
+# -1 marks fields that do not apply in or out of battle, so uint8 is not supported
+BROCK_OBSERVATION = ObservationLayout(
+    [
+        ObservationField("position", (3,), 0, 255),  # x, y, map_id
+        ObservationField("walls", (4,), -1, 1),  # top, bottom, right, left
+        ObservationField("battle", (1,), 0, 1),
+        ObservationField("is_grass", (1,), 0, 1),
+        ObservationField("enemy_hp", (1,), -1, 1, fraction=True),
+        ObservationField("action", (1,), -1, 5),
+        ObservationField("walkable", (9, 10), -1, 1),
+        ObservationField("fight_status", (4,), -1, 1),
+    ]
+)
+
+
+class BrockEpisodeState:
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        # store the visited map ids and tiles.
+        self.visited_coords = VisitCounter()
+        self.seen = VisitCounter()
+        # same_location_counter = 0
+        self.episode_battle_wins = 0
+        self.action = -1
+        self.left_wall = -1
+        self.right_wall = -1
+        self.top_wall = -1
+        self.bottom_wall = -1
+        self.prior_enemy_hp = -1
+        self.enemy_hp = -1
+
+    def copy(self) -> "BrockEpisodeState":
+        episode = copy.copy(self)
+        episode.visited_coords = self.visited_coords.copy()
+        episode.seen = self.seen.copy()
+        return episode
 
 
 class PokemonBrock(PokemonEnvironment):
@@ -15,7 +65,21 @@ class PokemonBrock(PokemonEnvironment):
             act_freq: int,
             emulation_speed: int = 0,
             headless: bool = False,
+            cell_archive: CellArchive = None,
+            backend: Callable = None,
+            copy_observations: bool = True,
+            observation_dtype: np.dtype = np.float64,
+            pixels: PixelObservation = None,
+            tile_grid: TileGridObservation = None,
     ) -> None:
+        # Optional Go-Explore archive - episodes resume from archived cells
+        self.cell_archive = cell_archive
+        # Per instance so several environments can share a process
+        self.episode = BrockEpisodeState()
+        # With copy_observations False _get_state returns a reused buffer
+        self.observation = ObservationWriter(
+            BROCK_OBSERVATION, dtype=observation_dtype, copy=copy_observations
+        )
 
         valid_actions: list[WindowEvent] = [
             WindowEvent.PRESS_ARROW_DOWN,
@@ -45,18 +109,35 @@ class PokemonBrock(PokemonEnvironment):
             valid_actions=valid_actions,
             release_button=release_button,
             headless=headless,
+            backend=backend,
+            pixels=pixels,
+            tile_grid=tile_grid,
         )
 
-    # store the visited coordinates.
-    visited_coords = []
-    seen = []
-    # same_location_counter = 0
-    episode_battle_wins = 0
-    action = -1
-    left_wall = -1
-    right_wall = -1
-    top_wall = -1
-    bottom_wall = -1
+    def reset(self) -> np.ndarray:
+        if self.cell_archive is None or len(self.cell_archive) == 0:
+            self.episode.reset()
+            return super().reset()
+
+        state = self.restore(self.cell_archive.select())
+        # Each episode gets the full step budget from the chosen cell
+        self.steps = 0
+        return state
+
+    def step(self, action) -> tuple:
+        state, reward, done, truncated = super().step(action)
+        if self.cell_archive is not None and not (done or truncated):
+            self.cell_archive.observe(self.prior_game_stats, self.snapshot)
+        return state, reward, done, truncated
+
+    def _get_episode_state(self) -> dict:
+        episode_state = super()._get_episode_state()
+        episode_state["brock"] = self.episode.copy()
+        return episode_state
+
+    def _set_episode_state(self, episode_state: dict) -> None:
+        super()._set_episode_state(episode_state)
+        self.episode = episode_state["brock"].copy()
 
     def _run_action_on_emulator(self, action_array):
         action = action_array[0]
@@ -66,71 +147,60 @@ class PokemonBrock(PokemonEnvironment):
         # We need to convert this to an action that the emulator can understand
         bins = np.linspace(0, 1, len(self.valid_actions) + 1)
         button = np.digitize(action, bins) - 1
-        self.action = button
+        self.episode.action = button
 
         # Push the button for a few frames
         self.pyboy.send_input(self.valid_actions[button])
 
-        for _ in range(self.act_freq):
-            self.pyboy.tick()
+        self._tick(self.act_freq)
 
         # Release the button
         self.pyboy.send_input(self.release_button[button])
 
     def _get_state(self) -> np.ndarray:
         # Implement your state retrieval logic here
-        game_stats = self._generate_game_stats()
+        game_stats = self._get_game_stats()
         self.get_wall_status()
         is_grass = self._is_grass_tile()
-        battle = (self._read_m(0xD057) != 0x00)
-        current_move = -1
+        battle = self._is_in_battle()
         # ======================================Left Over=====================================
         # game_stats["seen_pokemon"],
         # game_stats["caught_pokemon"],
         # sum(game_stats["xp"]),
         # self.read_hp_as_a_fraction(),
-        # len(self.seen),
-        # len(self.visited_coords),
+        # len(self.episode.seen),
+        # len(self.episode.visited_coords),
         # ======================================Left Over=====================================
+        obs = self.observation
+        obs["battle"][0] = battle
+        obs["is_grass"][0] = is_grass
+        obs["action"][0] = self.episode.action
+
         if battle:  # logic being that when in battle the state vector should not matter, we want it to do a set action
-            map_array = self._get_screen_walkable_matrix()
-            map_array = map_array.astype('int16')
-            map_array[:] = -1
-            fight_status_one_hot = np.zeros(4)
-            fight_status_one_hot[self._get_fight_status()] = 1
-            current_move = self._current_move()
-            state_vector = np.concatenate((np.array([
-                -1,
-                -1,
-                -1,
-                -1,
-                -1,
-                -1,
-                -1,
-                battle,
-                is_grass,
-                self.read_enemy_hp_as_fraction(),  # normalise it
-                self.action,
-            ]), map_array.flatten(), fight_status_one_hot))
+            obs["position"][:] = -1
+            obs["walls"][:] = -1
+            obs["enemy_hp"][0] = obs.scaled(
+                "enemy_hp", self.read_enemy_hp_as_fraction()
+            )  # normalise it
+            obs["walkable"][:] = -1
+            obs["fight_status"][:] = 0
+            obs["fight_status"][self._get_fight_status()] = 1
 
         else:  # traversing
-            fight_status_one_hot = np.ones(4) * -1
-            state_vector = np.concatenate((np.array([
-                game_stats["location"]["x"],
-                game_stats["location"]["y"],
-                game_stats["location"]["map_id"],
-                # obstacles?
-                self.top_wall,
-                self.bottom_wall,
-                self.right_wall,
-                self.left_wall,
-                battle,
-                is_grass,
-                -1,
-                self.action,
-            ]), self._get_screen_walkable_matrix().flatten(), fight_status_one_hot))
-
-        return state_vector
+            location = game_stats["location"]
+            obs["position"][:] = (location["x"], location["y"], location["map_id"])
+            # obstacles?
+            obs["walls"][:] = (
+                self.episode.top_wall,
+                self.episode.bottom_wall,
+                self.episode.right_wall,
+                self.episode.left_wall,
+            )
+            obs["enemy_hp"][0] = -1
+            obs["walkable"][:] = self._get_screen_walkable_matrix()
+            obs["fight_status"][:] = -1
+
+        return obs.output()
 
     def get_wall_status(self):
         map_data = self._get_screen_walkable_matrix()
@@ -158,31 +228,33 @@ class PokemonBrock(PokemonEnvironment):
         if player_y < len(map_data) - 1 and map_data[player_y + 1][player_x] == 1:
             walkable_down = 1
 
-        self.left_wall = walkable_left
-        self.right_wall = walkable_right
-        self.bottom_wall = walkable_down
-        self.top_wall = walkable_up
+        self.episode.left_wall = walkable_left
+        self.episode.right_wall = walkable_right
+        self.episode.bottom_wall = walkable_down
+        self.episode.top_wall = walkable_up
 
     def penalty_walls(self):
-        battle = (self._read_m(0xD057) != 0x00)
+        battle = self._is_in_battle()
         penalty = 0
         if battle:
             return 0
         else:
-            if self.left_wall == 0:
+            # Read here too as pixel and tile grid observations never call _get_state
+            self.get_wall_status()
+            if self.episode.left_wall == 0:
                 penalty += -0.1
-            if self.right_wall == 0:
+            if self.episode.right_wall == 0:
                 penalty += -0.1
-            if self.top_wall == 0:
+            if self.episode.top_wall == 0:
                 penalty += -0.1
-            if self.bottom_wall == 0:
+            if self.episode.bottom_wall == 0:
                 penalty += -0.1
         return penalty
 
     def read_enemy_hp_as_fraction(self) -> float:
         enemy_max = self._read_m(0xCFF5)
         max_hp = max(enemy_max, 1)
-        return self.enemy_hp / max_hp
+        return self.episode.enemy_hp / max_hp
 
     def read_hp_as_a_fraction(self) -> float:
         current_and_max_hp = self._read_party_hp()
@@ -195,28 +267,25 @@ class PokemonBrock(PokemonEnvironment):
 
         return current_hp / max_hp
 
-    prior_enemy_hp = -1
-    enemy_hp = -1
-
     def update_enemy_hp(self) -> None:
         enemy_hp = self._read_m(0xCFE7)
-        self.enemy_hp = enemy_hp
+        self.episode.enemy_hp = enemy_hp
 
     def battle_reward(self):
-        self.prior_enemy_hp = self.enemy_hp
+        self.episode.prior_enemy_hp = self.episode.enemy_hp
         self.update_enemy_hp()
         enemy_max = self._read_m(0xCFF5)
-        if self.enemy_hp < self.prior_enemy_hp:
+        if self.episode.enemy_hp < self.episode.prior_enemy_hp:
             print(
-                f"We engaged in mortal kombat: {self.prior_enemy_hp} - {self.enemy_hp} = {((self.prior_enemy_hp - self.enemy_hp) * 20)}")
-            if enemy_max > self.prior_enemy_hp:  # if we previously battled give a bigger reward
-                print("consecutive battle: ", ((self.prior_enemy_hp - self.enemy_hp) * 20) * 1.5)
-                return ((self.prior_enemy_hp - self.enemy_hp) * 20) * 1.5
-            return (self.prior_enemy_hp - self.enemy_hp) * 20
+                f"We engaged in mortal kombat: {self.episode.prior_enemy_hp} - {self.episode.enemy_hp} = {((self.episode.prior_enemy_hp - self.episode.enemy_hp) * 20)}")
+            if enemy_max > self.episode.prior_enemy_hp:  # if we previously battled give a bigger reward
+                print("consecutive battle: ", ((self.episode.prior_enemy_hp - self.episode.enemy_hp) * 20) * 1.5)
+                return ((self.episode.prior_enemy_hp - self.episode.enemy_hp) * 20) * 1.5
+            return (self.episode.prior_enemy_hp - self.episode.enemy_hp) * 20
         return 0
 
     def has_won(self, new_state):
-        if self.enemy_hp == 0 and self.prior_enemy_hp != 0:
+        if self.episode.enemy_hp == 0 and self.episode.prior_enemy_hp != 0:
             print(f"KILLED AN ENEMY + 300")
             return 300
         return 0
@@ -230,7 +299,7 @@ class PokemonBrock(PokemonEnvironment):
     def _calculate_reward(self, new_state: dict) -> float:
         # Implement your reward calculation logic here
         temp_reward = 0
-        battle_active = (self._read_m(0xD057) != 0x00)
+        battle_active = self._is_in_battle()
 
         # exploration rewards:
         if not battle_active:
@@ -243,24 +312,23 @@ class PokemonBrock(PokemonEnvironment):
             temp_reward += -0.5  # penalise idle battle state
             temp_reward += self.battle_reward()
         else:
-            self.enemy_hp = -1
-            self.prior_enemy_hp = -1
+            self.episode.enemy_hp = -1
+            self.episode.prior_enemy_hp = -1
         temp_reward += self.has_won(new_state)
 
         return temp_reward
 
     def exploration_reward(self, location):
-        key = f"{location}"
+        key = location_key(location)
         reward = -1
 
         # if self._is_grass_tile():
         #     reward += 0.5
         # #
-        # if key in self.seen and self._is_grass_tile():  # only penalise staying in the same place if its grass and not battle
+        # if key in self.episode.seen and self._is_grass_tile():  # only penalise staying in the same place if its grass and not battle
         #     reward += -1
 
-        if location["map_id"] not in self.visited_coords:
-            self.visited_coords.append(location["map_id"])
+        if self.episode.visited_coords.visit(location["map_id"]) == 1:
             bruh = location["map_id"]
             print(f"new location!: {bruh}")
             if bruh != 40:
@@ -276,7 +344,7 @@ class PokemonBrock(PokemonEnvironment):
 
         if location["map_id"] == 12:
             if self.prior_game_stats["location"]["y"] > location["y"] and self.prior_game_stats["location"]["map_id"] == \
-                    location["map_id"] and key not in self.seen:
+                    location["map_id"] and key not in self.episode.seen:
                 distance_to_goal = abs(0 - location["y"])
                 reward += 2 + (50 / (distance_to_goal + 1))
                 print("Reward for area 12: ", 2 + (50 / (distance_to_goal + 1)))
@@ -287,13 +355,12 @@ class PokemonBrock(PokemonEnvironment):
                 print(f"current:{location}")
 
         elif self.prior_game_stats["location"]["y"] > location["y"] and self.prior_game_stats["location"]["map_id"] == \
-                location["map_id"] and key not in self.seen:
+                location["map_id"] and key not in self.episode.seen:
             distance_to_goal = abs(0 - location["y"])
             reward += 1 + (50 / (distance_to_goal + 1))
 
-        # if unseen then reward it and add it
-        if key not in self.seen:
-            self.seen.append(key)
+        # if unseen then reward it, seen keeps the visit count for every tile
+        if self.episode.seen.visit(key) == 1:
             reward += 1
 
         return reward
@@ -304,9 +371,9 @@ class PokemonBrock(PokemonEnvironment):
     #     reward = 0
     #
     #     # Reward for visiting new locations
-    #     if location["map_id"] not in self.visited_coords:
-    #         self.visited_coords.append(location["map_id"])
-    #         distance_bonus = 1 / (len(self.visited_coords) + 1)
+    #     if location["map_id"] not in self.episode.visited_coords:
+    #         self.episode.visited_coords.append(location["map_id"])
+    #         distance_bonus = 1 / (len(self.episode.visited_coords) + 1)
     #         reward += 100 * distance_bonus
     #         print(f"New location! Scaled reward: {reward}")
     #
@@ -333,8 +400,8 @@ class PokemonBrock(PokemonEnvironment):
     #     print(f"Reward for progression toward target: {reward}")
     #
     #     # Small reward for visiting an unseen location
-    #     if key not in self.seen:
-    #         self.seen.append(key)
+    #     if key not in self.episode.seen:
+    #         self.episode.seen.append(key)
     #         reward += 1
     #
     #     # Clip the reward to prevent instability
@@ -349,15 +416,6 @@ class PokemonBrock(PokemonEnvironment):
     def _check_if_truncated(self, game_stats: dict) -> bool:
         # Implement your truncation check logic here
         if self.steps >= 5000:
-            self.visited_coords.clear()
-            self.seen.clear()
-            self.enemy_hp = -1
-            self.prior_enemy_hp = -1
-            self.action = -1
-            self.left_wall = 0
-            self.right_wall = 0
-            self.top_wall = 0
-            self.bottom_wall = 0
-            # self.recent_locations.clear()
+            # Episode bookkeeping is cleared by the following reset
             return True
         return False
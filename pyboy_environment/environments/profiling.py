@@ -0,0 +1,97 @@
+# Opt in per phase timing of PyboyEnvironment.step
+
+import time
+
+import numpy as np
+
+# Phases in the order step runs them, "step" is the whole call
+PHASES = ("action", "state", "stats", "reward", "done", "truncated", "step")
+
+
+class StepTimer:
+    # Timestamps of a single step, mark() is called at the end of each phase
+
+    def __init__(self, profiler: "StepProfiler") -> None:
+        self.profiler = profiler
+        self.timestamps = [time.perf_counter_ns()]
+
+    def mark(self) -> None:
+        self.timestamps.append(time.perf_counter_ns())
+
+    def record(self) -> None:
+        self.profiler.record(self.timestamps)
+
+
+class NullTimer:
+    # Stands in for StepTimer when profiling is off
+
+    def mark(self) -> None:
+        pass
+
+    def record(self) -> None:
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class StepProfiler:
+    """
+    Nanosecond timings of the last capacity steps, one ring buffer per phase.
+
+    Game stats are cached per frame, so when _get_state reads them first
+    their cost shows up in "state" rather than "stats".
+    """
+
+    def __init__(self, capacity: int = 10000) -> None:
+        self.capacity = capacity
+        self.timings = np.zeros((len(PHASES), capacity), dtype=np.int64)
+        self.total_steps = 0
+
+    def __len__(self) -> int:
+        return min(self.total_steps, self.capacity)
+
+    def start(self) -> StepTimer:
+        return StepTimer(self)
+
+    def record(self, timestamps: list[int]) -> None:
+        # timestamps holds the start of the step followed by the end of each phase
+        index = self.total_steps % self.capacity
+        start = timestamps[0]
+        previous = start
+        for phase, timestamp in enumerate(timestamps[1:]):
+            self.timings[phase, index] = timestamp - previous
+            previous = timestamp
+        self.timings[-1, index] = previous - start
+        self.total_steps += 1
+
+    def phase_timings(self, phase: str) -> np.ndarray:
+        return self.timings[PHASES.index(phase), : len(self)]
+
+    def percentiles(
+        self, q: tuple[float, ...] = (50, 90, 99)
+    ) -> dict[str, dict[float, float]]:
+        if len(self) == 0:
+            return {}
+        values = np.percentile(self.timings[:, : len(self)], q, axis=1)
+        return {
+            phase: {p: float(values[i, j]) for i, p in enumerate(q)}
+            for j, phase in enumerate(PHASES)
+        }
+
+    def steps_per_second(self) -> float:
+        # Based on time spent inside step only, the agent's time is excluded
+        if len(self) == 0:
+            return 0.0
+        return 1e9 / float(np.mean(self.phase_timings("step")))
+
+    def summary(self) -> dict[str, any]:
+        return {
+            "steps": self.total_steps,
+            "steps_per_second": self.steps_per_second(),
+            "percentiles_ns": self.percentiles(),
+        }
+
+    def clear(self) -> None:
+        self.timings[:] = 0
+        self.total_steps = 0
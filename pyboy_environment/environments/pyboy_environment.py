@@ -1,13 +1,55 @@
+import asyncio
+import io
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from functools import cached_property
 from pathlib import Path
+from typing import Any, Callable, NamedTuple
 
 import cv2
 import numpy as np
 from pyboy import PyBoy
 
+from pyboy_environment.environments.observation import ObservationWriter
+from pyboy_environment.environments.pixels import PixelObservation
+from pyboy_environment.environments.profiling import NULL_TIMER, StepProfiler
+from pyboy_environment.environments.tile_grid import TileGridObservation
+
+# Savestates are read from disk once and shared by every environment in the process
+_init_states: dict[str, bytes] = {}
+
+
+def _read_init_state(path: str) -> bytes:
+    state = _init_states.get(path)
+    if state is None:
+        with open(path, "rb") as f:
+            state = f.read()
+        _init_states[path] = state
+    return state
+
+
+class Snapshot(NamedTuple):
+    # In-memory checkpoint of an environment, see PyboyEnvironment.snapshot
+    emulator_state: bytes
+    episode_state: dict
+
+
+async def gather_steps(environments: list, actions: list) -> list[tuple]:
+    # Steps every environment on its own emulator thread without blocking the
+    # event loop. pyboy holds the GIL while emulating, so the emulators still
+    # run one at a time - VectorPyboyEnvironment.astep runs them in parallel
+    return await asyncio.gather(
+        *(env.astep(action) for env, action in zip(environments, actions))
+    )
+
+
+async def gather_resets(environments: list) -> list[np.ndarray]:
+    return await asyncio.gather(*(env.areset() for env in environments))
+
 
 class PyboyEnvironment(metaclass=ABCMeta):
+    # Writer of the _get_state observations, set by subclasses that use one
+    observation: ObservationWriter = None
 
     def __init__(
         self,
@@ -20,7 +62,13 @@ class PyboyEnvironment(metaclass=ABCMeta):
         release_button: list,
         emulation_speed: int = 0,
         headless: bool = False,
+        backend: Callable = None,
+        pixels: PixelObservation = None,
+        tile_grid: TileGridObservation = None,
     ) -> None:
+        if pixels is not None and tile_grid is not None:
+            raise ValueError("Choose either pixel or tile grid observations, not both")
+
         self.task = task
         self.domain = domain
 
@@ -28,6 +76,14 @@ class PyboyEnvironment(metaclass=ABCMeta):
         self.rom_path = f"{path}/{rom_name}"
         self.init_path = f"{path}/task_init_states/{init_state_file_name}"
 
+        self._init_state = None
+        self._init_game_stats = None
+
+        self._executor = None
+
+        # Opt in step timings, see enable_profiling
+        self.profiler = None
+
         self.combo_actions = 0
 
         self.valid_actions = valid_actions
@@ -36,13 +92,30 @@ class PyboyEnvironment(metaclass=ABCMeta):
 
         self.act_freq = act_freq
 
+        self.headless = headless
+        # Pixel observations replace _get_state and need every step rendered
+        self.pixels = pixels
+        # Tile grid observations replace _get_state and are read from VRAM and OAM
+        self.tile_grid = tile_grid
+        # Only the last frame of a step is ever rendered, and none at all when
+        # nothing looks at the screen. grab_frame turns rendering on when used
+        self.render_frames = not headless or pixels is not None
+
+        # backend stands in for the PyBoy class, e.g. fake_pyboy.fake_backend()
+        if backend is None:
+            backend = PyBoy
+
         head = "null" if headless else "SDL2"
-        self.pyboy = PyBoy(
+        self.pyboy = backend(
             self.rom_path,
             window=head,
         )
 
-        self.prior_game_stats = self._generate_game_stats()
+        # Values derived from RAM are memoized per emulated frame
+        self._frame_cache = {}
+        self._cache_frame = None
+
+        self.prior_game_stats = self._get_game_stats()
         self.screen = self.pyboy.screen
 
         self.steps = 0
@@ -60,14 +133,99 @@ class PyboyEnvironment(metaclass=ABCMeta):
     def reset(self) -> np.ndarray:
         self.steps = 0
 
-        with open(self.init_path, "rb") as f:
-            self.pyboy.load_state(f)
+        if self._init_state is None:
+            self._init_state = io.BytesIO(self._read_init_state())
+        self._init_state.seek(0)
+        self._load_state(self._init_state)
 
-        self.prior_game_stats = self._generate_game_stats()
+        # The init state is always the same, so are the stats read from it
+        if self._init_game_stats is None:
+            self._init_game_stats = self._get_game_stats()
+        self.prior_game_stats = self._frame_cached(
+            "game_stats", lambda: self._init_game_stats
+        )
 
-        return self._get_state()
+        return self._get_observation(reset=True)
+
+    def _read_init_state(self) -> bytes:
+        # Backends without a savestate file provide their start state through
+        # initial_state(), see fake_pyboy.FakePyBoy
+        initial_state = getattr(self.pyboy, "initial_state", None)
+        if initial_state is not None:
+            return initial_state()
+        return _read_init_state(self.init_path)
+
+    def observation_schema(self) -> dict[str, any]:
+        # Declared dtype, size and fields of state observations, None for pixel
+        # and tile grid observations or without an ObservationWriter
+        if self.observation is None or self.pixels is not None:
+            return None
+        if self.tile_grid is not None:
+            return None
+        return self.observation.schema()
+
+    def set_observation_buffer(self, out: np.ndarray) -> bool:
+        # Writes state observations straight into out, e.g. a row of a vector
+        # environment's shared memory, and returns out itself from then on.
+        # False when observations are not written by a writer of out's dtype
+        if self.observation_schema() is None or self.observation.dtype != out.dtype:
+            return False
+        self.observation = ObservationWriter(
+            self.observation.layout, copy=False, out=out
+        )
+        return True
+
+    def snapshot(self) -> Snapshot:
+        with io.BytesIO() as f:
+            self.pyboy.save_state(f)
+            emulator_state = f.getvalue()
+        return Snapshot(emulator_state, self._get_episode_state())
+
+    def restore(self, snapshot: Snapshot) -> np.ndarray:
+        # A snapshot can be restored any number of times
+        self._load_state(io.BytesIO(snapshot.emulator_state))
+        self._set_episode_state(snapshot.episode_state)
+        return self._get_observation(reset=True)
+
+    def _get_episode_state(self) -> dict:
+        # Python side bookkeeping of the episode - subclasses add their own and
+        # must copy anything mutable so snapshots stay independent
+        return {"steps": self.steps, "prior_game_stats": self.prior_game_stats}
+
+    def _set_episode_state(self, episode_state: dict) -> None:
+        self.steps = episode_state["steps"]
+        self.prior_game_stats = episode_state["prior_game_stats"]
+
+    async def areset(self) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._emulator_executor(), self.reset)
+
+    async def astep(self, action) -> tuple:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._emulator_executor(), self.step, action)
+
+    def _emulator_executor(self) -> ThreadPoolExecutor:
+        # A single thread per environment so async calls never overlap on one
+        # emulator. It only keeps emulation off the event loop, pyboy never
+        # releases the GIL so there is no parallel speed-up between environments
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"{self.domain}-{self.task}"
+            )
+        return self._executor
+
+    def close(self) -> None:
+        # Waits for a pending astep or areset before stopping the emulator
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.pyboy.stop(save=False)
 
     def grab_frame(self, height: int = 240, width: int = 300) -> np.ndarray:
+        if not self.render_frames:
+            # The screen is rendered from the next step on, this frame may be stale
+            self.render_frames = True
+
         frame = np.array(self.screen.image)
         frame = cv2.resize(frame, (width, height))
         # Convert to BGR for use with OpenCV
@@ -77,23 +235,80 @@ class PyboyEnvironment(metaclass=ABCMeta):
     def game_area(self) -> np.ndarray:
         return self.pyboy.game_area()
 
+    def enable_profiling(self, capacity: int = 10000) -> StepProfiler:
+        self.profiler = StepProfiler(capacity)
+        return self.profiler
+
+    def disable_profiling(self) -> None:
+        self.profiler = None
+
     def step(self, action) -> tuple:
+        # The timer marks the end of each phase, a no-op unless profiling
+        timer = NULL_TIMER if self.profiler is None else self.profiler.start()
+
         self.steps += 1
 
         self._run_action_on_emulator(action)
+        timer.mark()
+
+        state = self._get_observation()
+        timer.mark()
 
-        state = self._get_state()
+        current_game_stats = self._get_game_stats()
+        timer.mark()
 
-        current_game_stats = self._generate_game_stats()
         reward = self._calculate_reward(current_game_stats)
+        timer.mark()
 
         done = self._check_if_done(current_game_stats)
+        timer.mark()
+
         truncated = self._check_if_truncated(current_game_stats)
+        timer.mark()
 
         self.prior_game_stats = current_game_stats
 
+        timer.record()
+
         return state, reward, done, truncated
 
+    def _get_observation(self, reset: bool = False) -> np.ndarray:
+        if self.tile_grid is not None:
+            return self.tile_grid.observe(self.pyboy.memory, self.screen)
+        if self.pixels is None:
+            return self._get_state()
+        if reset:
+            return self.pixels.reset(self.screen.ndarray)
+        return self.pixels.push(self.screen.ndarray)
+
+    def _tick(self, count: int) -> bool:
+        # One multi-frame tick, rendering at most the last frame
+        return self.pyboy.tick(count, self.render_frames)
+
+    def _load_state(self, file_like_object) -> None:
+        self.pyboy.load_state(file_like_object)
+        self._invalidate_frame_cache()
+
+    def _invalidate_frame_cache(self) -> None:
+        self._frame_cache.clear()
+        self._cache_frame = None
+
+    def _frame_cached(self, key: str, compute: Callable[[], Any]) -> Any:
+        # The frame counter advances on every tick, so anything read from the
+        # emulator is computed at most once per emulated frame
+        frame = self.pyboy.frame_count
+        if frame != self._cache_frame:
+            self._frame_cache.clear()
+            self._cache_frame = frame
+
+        if key not in self._frame_cache:
+            self._frame_cache[key] = compute()
+        return self._frame_cache[key]
+
+    def _get_game_stats(self) -> dict:
+        # Shared between callers within a frame - treat as read only
+        return self._frame_cached("game_stats", self._generate_game_stats)
+
     def _read_m(self, addr: int) -> int:
         return self.pyboy.memory[addr]
 
@@ -0,0 +1,111 @@
+# Screen sized grid of background tile ids with sprites drawn on top, the same
+# representation as pyboy's game_area with the tile ids remapped to a small vocabulary.
+#
+# https://gbdev.io/pandocs/OAM.html
+
+import numpy as np
+
+from pyboy_environment.environments import tilemap as tm
+
+TILE_ID_COUNT = 384
+
+OAM_ADDRESS = 0xFE00
+SPRITE_COUNT = 40
+SPRITE_BYTES = 4
+# LCDC bit 2 selects 8x16 sprites
+TALL_SPRITES = 0x04
+
+
+def build_vocabulary(tile_ids: np.ndarray, size: int = 256) -> np.ndarray:
+    # The size - 1 most frequent tile ids get 1, 2, ... in order of frequency,
+    # every other id maps to 0
+    ids, counts = np.unique(np.asarray(tile_ids).ravel(), return_counts=True)
+    ids = ids[np.argsort(-counts, kind="stable")][: size - 1]
+
+    vocabulary = np.zeros(TILE_ID_COUNT, dtype=np.uint16)
+    vocabulary[ids] = np.arange(1, len(ids) + 1)
+    return vocabulary
+
+
+class TileGridObservation:
+    """
+    Visible background tile ids through vocabulary, with on screen sprites
+    overlaid as vocabulary[tile] + sprite_offset like pyboy's game_area.
+
+    vocabulary maps the 384 unified tile ids to observation values, identity
+    by default - mario_tile_grid and pokemon_tile_grid set up the compact
+    vocabularies of each game. first_row and rows select a band of the 18 screen rows, its
+    scroll is read from the band's first scanline so HUDs that do not scroll
+    are handled. The grid is uint8 whenever the vocabulary allows.
+    """
+
+    def __init__(
+        self,
+        vocabulary: np.ndarray = None,
+        first_row: int = 0,
+        rows: int = None,
+        sprites: bool = True,
+        sprite_offset: int = 0,
+        copy: bool = True,
+    ) -> None:
+        if vocabulary is None:
+            vocabulary = np.arange(TILE_ID_COUNT)
+        vocabulary = np.asarray(vocabulary)
+        if vocabulary.shape != (TILE_ID_COUNT,):
+            raise ValueError(
+                f"vocabulary must map all {TILE_ID_COUNT} tile ids, got shape {vocabulary.shape}"
+            )
+
+        highest = int(vocabulary.max()) + (sprite_offset if sprites else 0)
+        dtype = np.uint8 if highest <= np.iinfo(np.uint8).max else np.uint16
+        self.vocabulary = vocabulary.astype(dtype)
+
+        if rows is None:
+            rows = tm.SCREEN_TILE_ROWS - first_row
+        self.first_row = first_row
+        self.rows = tm.SCREEN_ROWS[first_row : first_row + rows]
+        self.sprites = sprites
+        self.sprite_offset = sprite_offset
+        self.copy = copy
+
+        self.shape = (len(self.rows), tm.SCREEN_TILE_COLUMNS)
+        self._grid = np.zeros(self.shape, dtype=dtype)
+
+    def observe(self, memory, screen) -> np.ndarray:
+        scx, scy = screen.tilemap_position_list[self.first_row * 8][:2]
+        rows, columns = tm.window_indices(scx, scy, self.rows)
+        tilemap = tm.read_background_tilemap(memory)
+        np.take(self.vocabulary, tilemap[rows, columns], out=self._grid)
+
+        if self.sprites:
+            self._overlay_sprites(memory)
+        return self._grid.copy() if self.copy else self._grid
+
+    def _overlay_sprites(self, memory) -> None:
+        oam = np.array(
+            memory[OAM_ADDRESS : OAM_ADDRESS + SPRITE_COUNT * SPRITE_BYTES],
+            dtype=np.int16,
+        ).reshape(SPRITE_COUNT, SPRITE_BYTES)
+        y = oam[:, 0] - 16
+        x = oam[:, 1] - 8
+        tiles = oam[:, 2]
+
+        if memory[tm.LCDC_ADDRESS] & TALL_SPRITES:
+            # The lower half of an 8x16 sprite is the next tile
+            y = np.concatenate((y, y + 8))
+            x = np.concatenate((x, x))
+            tiles = np.concatenate((tiles & 0xFE, tiles | 0x01))
+
+        # Floor division keeps partly hidden sprites off the grid like pyboy
+        rows = y // 8 - self.first_row
+        columns = x // 8
+        visible = (
+            (rows >= 0)
+            & (rows < self.shape[0])
+            & (columns >= 0)
+            & (columns < self.shape[1])
+        )
+        # Later sprites overwrite earlier ones in the same cell
+        self._grid[rows[visible], columns[visible]] = (
+            self.vocabulary[tiles[visible]] + self.sprite_offset
+        )
@@ -0,0 +1,55 @@
+# Bulk reads of the Game Boy background tile map straight from VRAM.
+#
+# https://gbdev.io/pandocs/Tile_Maps.html
+# https://gbdev.io/pandocs/LCDC.html
+
+import numpy as np
+
+TILEMAP_SIZE = 32
+SCREEN_TILE_ROWS = 18
+SCREEN_TILE_COLUMNS = 20
+
+LCDC_ADDRESS = 0xFF40
+LOW_TILEMAP = 0x9800
+HIGH_TILEMAP = 0x9C00
+
+# Tile identifiers unified into 0-383 the same way pyboy.api.tilemap.TileMap does
+_UNSIGNED_TILE_IDS = np.arange(256, dtype=np.uint16)
+_SIGNED_TILE_IDS = np.array(
+    [tile + 0x100 if tile < 0x80 else tile for tile in range(256)], dtype=np.uint16
+)
+
+SCREEN_ROWS = np.arange(SCREEN_TILE_ROWS)
+SCREEN_COLUMNS = np.arange(SCREEN_TILE_COLUMNS)
+
+
+def read_background_tilemap(memory) -> np.ndarray:
+    # Equivalent to np.array(pyboy.tilemap_background[:, :]) with a single slice read
+    lcdc = memory[LCDC_ADDRESS]
+    start = HIGH_TILEMAP if lcdc & 0x08 else LOW_TILEMAP
+    raw = np.array(memory[start : start + TILEMAP_SIZE * TILEMAP_SIZE], dtype=np.uint8)
+    tile_ids = _UNSIGNED_TILE_IDS if lcdc & 0x10 else _SIGNED_TILE_IDS
+    return tile_ids[raw].reshape(TILEMAP_SIZE, TILEMAP_SIZE)
+
+
+def window_indices(
+    scx: int,
+    scy: int,
+    rows: np.ndarray = SCREEN_ROWS,
+    columns: np.ndarray = SCREEN_COLUMNS,
+    round_up: bool = False,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Wrapped tile map indices of the visible screen, usable as tilemap[indices].
+    # A partly scrolled out tile is included like pyboy's game_area (SCX // 8).
+    # round_up skips it instead, as np.roll(tilemap, -scx // 8) always did for
+    # the Pokemon walkable matrix
+    if round_up:
+        row_offset = -(-scy // 8)
+        column_offset = -(-scx // 8)
+    else:
+        row_offset = scy // 8
+        column_offset = scx // 8
+    return (
+        ((rows + row_offset) % TILEMAP_SIZE)[:, None],
+        ((columns + column_offset) % TILEMAP_SIZE)[None, :],
+    )
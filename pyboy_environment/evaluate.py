@@ -5,10 +5,16 @@ Do NOT edit this file as it runs the evaluation methodology for the Trained Poke
 import argparse
 import json
 import logging
+import multiprocessing as mp
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
 import cares_reinforcement_learning.util.configurations as configurations
 from cares_reinforcement_learning.util.network_factory import NetworkFactory
+from pyboy_environment.compare_results import ranking_key, summarise_result
 from pyboy_environment.environments.pokemon.tasks.brock import PokemonBrock
 
 logging.basicConfig(level=logging.INFO)
@@ -25,12 +31,30 @@ def get_args():
 
     parse_args.add_argument("-r", "--results_path", type=str, required=True)
 
+    # More than one rollout switches to the parallel evaluation below
+    parse_args.add_argument("-k", "--rollouts", type=int, default=1)
+
+    parse_args.add_argument("-w", "--workers", type=int, default=os.cpu_count())
+
+    parse_args.add_argument("-s", "--seed", type=int, default=0)
+
+    # Random number of idle frames before each parallel rollout so that
+    # deterministic agents still produce independent rollouts
+    parse_args.add_argument("--noop_max", type=int, default=30)
+
     return parse_args.parse_args()
 
 
 def run_agent(env, agent, num_episodes, results_path):
+    final_stats = play_agent(env, agent, num_episodes)
 
-    state = env.reset()
+    with open(f"{results_path}/results.json", "w", encoding="utf-8") as file:
+        json.dump(final_stats, file)
+
+
+def play_agent(env, agent, num_episodes, state=None):
+    if state is None:
+        state = env.reset()
     for step in range(0, num_episodes):
         if step % 100 == 0:
             logging.info(f"Step: {step}")
@@ -46,11 +70,10 @@ def run_agent(env, agent, num_episodes, results_path):
 
     logging.info(f"Final Stats: {final_stats}")
 
-    with open(f"{results_path}/results.json", "w", encoding="utf-8") as file:
-        json.dump(final_stats, file)
+    return final_stats
 
 
-def run(results_path, model_file_path, model_file_name):
+def load_agent(env, model_file_path, model_file_name):
     algorithm = model_file_name.split("-")[0]
 
     class_ = getattr(configurations, f"{algorithm}Config")
@@ -58,21 +81,142 @@ def run(results_path, model_file_path, model_file_name):
 
     network_factory = NetworkFactory()
 
-    brock_task = PokemonBrock(act_freq=24, headless=True)
-
     agent = network_factory.create_network(
-        brock_task.observation_space, brock_task.action_num, algorithm_config
+        env.observation_space, env.action_num, algorithm_config
     )
 
     agent.load_models(model_file_path, model_file_name)
 
+    return agent
+
+
+def run(results_path, model_file_path, model_file_name):
+    brock_task = PokemonBrock(act_freq=24, headless=True)
+
+    agent = load_agent(brock_task, model_file_path, model_file_name)
+
     run_agent(brock_task, agent, 10000, results_path)
 
 
+def run_rollout(
+    results_path, model_file_path, model_file_name, rollout, seed, noop_max
+):
+    # Only the rollout workers need torch, it is slow to import
+    import torch
+
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    brock_task = PokemonBrock(act_freq=24, headless=True)
+    brock_task.set_seed(seed)
+
+    agent = load_agent(brock_task, model_file_path, model_file_name)
+
+    state = brock_task.reset()
+    noop_frames = random.randint(0, noop_max)
+    if noop_frames > 0:
+        brock_task._tick(noop_frames)
+        state = brock_task._get_state()
+
+    final_stats = play_agent(brock_task, agent, 10000, state=state)
+    final_stats["rollout"] = rollout
+    final_stats["seed"] = seed
+    final_stats["noop_frames"] = noop_frames
+
+    with open(
+        f"{results_path}/rollouts/rollout_{rollout}.json", "w", encoding="utf-8"
+    ) as file:
+        json.dump(final_stats, file)
+
+    return final_stats
+
+
+def median_rollout(rollout_stats):
+    # The rollout in the middle of the ranking compare_results uses
+    ranked = sorted(
+        rollout_stats,
+        key=lambda stats: ranking_key(summarise_result(None, stats)),
+    )
+    return ranked[len(ranked) // 2]
+
+
+def summarise_rollouts(rollout_stats):
+    metrics = {
+        "badges": [stats["badges"] for stats in rollout_stats],
+        "actions": [stats["actions"] for stats in rollout_stats],
+        "caught_pokemon": [stats["caught_pokemon"] for stats in rollout_stats],
+        "seen_pokemon": [stats["seen_pokemon"] for stats in rollout_stats],
+        "mean_level": [float(np.mean(stats["levels"])) for stats in rollout_stats],
+        "mean_xp": [float(np.mean(stats["xp"])) for stats in rollout_stats],
+        "money": [stats["money"] for stats in rollout_stats],
+    }
+
+    summary = {"rollouts": len(rollout_stats)}
+    for name, values in metrics.items():
+        summary[name] = {
+            "mean": float(np.mean(values)),
+            "std": float(np.std(values)),
+            "min": float(np.min(values)),
+            "max": float(np.max(values)),
+        }
+    return summary
+
+
+def run_parallel(
+    results_path, model_file_path, model_file_name, rollouts, workers, seed, noop_max
+):
+    Path(f"{results_path}/rollouts").mkdir(parents=True, exist_ok=True)
+
+    # Spawned workers each build their own emulator and agent
+    with ProcessPoolExecutor(
+        max_workers=min(workers, rollouts), mp_context=mp.get_context("spawn")
+    ) as executor:
+        futures = [
+            executor.submit(
+                run_rollout,
+                results_path,
+                model_file_path,
+                model_file_name,
+                rollout,
+                seed + rollout,
+                noop_max,
+            )
+            for rollout in range(rollouts)
+        ]
+        rollout_stats = [future.result() for future in futures]
+
+    summary = summarise_rollouts(rollout_stats)
+    logging.info(f"Summary: {summary}")
+
+    # results.json holds the median rollout in the single rollout format, so
+    # compare_results ranks parallel evaluations like any other
+    median_stats = dict(median_rollout(rollout_stats))
+    summary["median_rollout"] = median_stats.pop("rollout")
+    del median_stats["seed"], median_stats["noop_frames"]
+
+    with open(f"{results_path}/summary.json", "w", encoding="utf-8") as file:
+        json.dump(summary, file)
+
+    with open(f"{results_path}/results.json", "w", encoding="utf-8") as file:
+        json.dump(median_stats, file)
+
+
 def main():
     args = get_args()
 
-    run(args.results_path, args.model_path, args.model_name)
+    if args.rollouts > 1:
+        run_parallel(
+            args.results_path,
+            args.model_path,
+            args.model_name,
+            args.rollouts,
+            args.workers,
+            args.seed,
+            args.noop_max,
+        )
+    else:
+        run(args.results_path, args.model_path, args.model_name)
 
 
 if __name__ == "__main__":
@@ -2,45 +2,180 @@
 Do NOT edit this file as it runs the evaluation methodology for the Trained Pokemon agents.
 """
 
+import argparse
+import glob
+import hashlib
 import logging
 import os
-import subprocess
+import shutil
+import sys
+import tempfile
 from pathlib import Path
 
-import virtualenv
 from pydrive2.auth import GoogleAuth
 from pydrive2.drive import GoogleDrive
 
+from pyboy_environment.submission_scheduler import (
+    BROCK_PATH,
+    Deadline,
+    JobJournal,
+    LocalDirectorySource,
+    SubmissionScheduler,
+    SubmissionSource,
+)
+
 logging.basicConfig(level=logging.INFO)
 
 
-def run_venv(upi, requirement_path, model_path, model_name):
-    path = f"{os.path.expanduser('~')}/venv"
-    venv_dir = os.path.join(path, f"{upi}")
-    virtualenv.cli_run([venv_dir])
+VENV_CACHE_PATH = f"{Path.home()}/venv/cache"
+
+WHEELHOUSE_PATH = f"{Path.home()}/wheelhouse"
+
+
+def hash_files(*paths):
+    # Content hash, so identical requirements from any location share a venv
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def hash_tree(path):
+    # Paths and contents of every file under path, skipping VCS metadata and
+    # build output, so any edit to a source tree gives a new hash
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(
+            d
+            for d in dirs
+            if not d.startswith(".")
+            and d not in ("__pycache__", "build", "dist")
+            and not d.endswith(".egg-info")
+        )
+        for name in sorted(files):
+            if name.endswith(".pyc"):
+                continue
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).encode())
+            digest.update(b"\0")
+            with open(file_path, "rb") as f:
+                digest.update(f.read())
+            digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def site_packages(venv_dir):
+    return glob.glob(f"{venv_dir}/lib/python3*/site-packages")[0]
+
+
+def pip_install(venv_dir, *args, deadline=None):
+    # Offline from the local wheelhouse, sdists in it are built locally
+    deadline = Deadline() if deadline is None else deadline
+    command = [
+        f"{venv_dir}/bin/python3",
+        "-m",
+        "pip",
+        "install",
+        "--no-index",
+        "--find-links",
+        WHEELHOUSE_PATH,
+        *args,
+    ]
+    if deadline.run(command) != 0:
+        raise RuntimeError(
+            f"Offline install of {' '.join(args)} failed, add the missing packages to {WHEELHOUSE_PATH}"
+        )
+
+
+def build_venv(venv_dir, install, base_dir=None, deadline=None):
+    # Built in a directory of its own so an interrupted build is never cached
+    # and concurrent builds of the same venv do not touch each other
+    if os.path.exists(venv_dir):
+        return venv_dir
+    deadline = Deadline() if deadline is None else deadline
+
+    os.makedirs(os.path.dirname(venv_dir), exist_ok=True)
+    build_dir = tempfile.mkdtemp(
+        prefix=f"{os.path.basename(venv_dir)}.build-",
+        dir=os.path.dirname(venv_dir),
+    )
+    try:
+        exit_code = deadline.run([sys.executable, "-m", "virtualenv", build_dir])
+        if exit_code != 0:
+            raise RuntimeError(f"virtualenv exited with {exit_code}")
+
+        if base_dir is not None:
+            # Layer on top of the shared base venv through a .pth file
+            with open(f"{site_packages(build_dir)}/_base_venv.pth", "w") as f:
+                f.write(f"{site_packages(base_dir)}\n")
+
+        install(build_dir, deadline)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+
+    # Only bin/python3 is used from here on, which still works after the move
+    try:
+        os.rename(build_dir, venv_dir)
+    except OSError:
+        # Another build of the same venv finished first
+        shutil.rmtree(build_dir, ignore_errors=True)
+    return venv_dir
+
+
+def base_venv(deadline=None):
+    cares_rl_path = f"{Path.home()}/workspace/cares_reinforcement_learning"
+    # cares_rl is installed as a copy, so its source is part of the key too
+    cares_hash = hash_tree(cares_rl_path)
+
+    def install(venv_dir, deadline):
+        # virtualenv no longer seeds setuptools on Python 3.12+, but building
+        # without isolation needs it in the venv
+        pip_install(venv_dir, "setuptools", "wheel", deadline=deadline)
+        pip_install(
+            venv_dir, "-r", f"{cares_rl_path}/requirements.txt", deadline=deadline
+        )
+        pip_install(venv_dir, "--no-build-isolation", cares_rl_path, deadline=deadline)
+
+    return build_venv(
+        f"{VENV_CACHE_PATH}/base-{cares_hash}", install, deadline=deadline
+    )
 
-    python_bin = f"{path}/{upi}/bin/python3"
 
-    cares_rl_path = f"{Path.home()}/workspace/cares_reinforcement_learning"
+def submission_venv(requirement_path, deadline=None):
+    # deadline covers the whole preparation, including building the base venv
+    deadline = Deadline() if deadline is None else deadline
+    base_dir = base_venv(deadline)
+    requirements_file = f"{requirement_path}/requirements.txt"
+    venv_name = f"{os.path.basename(base_dir)}-{hash_files(requirements_file)}"
+
+    def install(venv_dir, deadline):
+        pip_install(venv_dir, "-r", requirements_file, deadline=deadline)
 
-    command = (
-        f". {venv_dir}/bin/activate && pip install -r {cares_rl_path}/requirements.txt"
+    return build_venv(
+        f"{VENV_CACHE_PATH}/{venv_name}", install, base_dir=base_dir, deadline=deadline
     )
-    os.system(command)
 
-    command = f". {venv_dir}/bin/activate && pip install {cares_rl_path}"
-    os.system(command)
 
-    command = f". {venv_dir}/bin/activate && pip install -r {requirement_path}/requirements.txt"
-    os.system(command)
+def run_evaluation(
+    venv_dir, upi, requirement_path, model_path, model_name, deadline=None
+):
+    # The submission's own package is put on the path instead of being installed
+    python_bin = f"{venv_dir}/bin/python3"
+    deadline = Deadline() if deadline is None else deadline
 
-    command = f". {venv_dir}/bin/activate && pip install {requirement_path}"
-    os.system(command)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [requirement_path, env.get("PYTHONPATH")])
+    )
 
-    p = subprocess.Popen(
+    exit_code = deadline.run(
         [
             python_bin,
-            "evaluate.py",
+            f"{requirement_path}/pyboy_environment/evaluate.py",
             "--upi",
             upi,
             "--model_path",
@@ -49,11 +184,17 @@ def run_venv(upi, requirement_path, model_path, model_name):
             model_name,
             "--results_path",
             model_path,
-        ]
+        ],
+        env=env,
     )
-
-    exit_code = p.wait()
     print(f"Exit code: {exit_code} {upi}")
+    return exit_code
+
+
+def run_venv(upi, requirement_path, model_path, model_name):
+    # Venvs are shared by every submission with the same requirements.txt
+    venv_dir = submission_venv(requirement_path)
+    return run_evaluation(venv_dir, upi, requirement_path, model_path, model_name)
 
 
 def read_folder(drive, title, file_id):
@@ -93,24 +234,18 @@ def print_folders(directory, tab=0):
         print_folders(folder, tab=tab + 5)
 
 
-def main():
-    gauth = GoogleAuth()
-    gauth.LocalWebserverAuth()
-
-    drive = GoogleDrive(gauth)
-
-    # COMPSYS726 - Assignment 1 Folder
-    primary_folder_id = "1OWORBjdzuJjPZYZoCKMs4hI3xemvcDzh"
+class DriveSource(SubmissionSource):
+    def __init__(self, drive, title, file_id):
+        self.drive = drive
+        self.directory = read_folder(drive, title, file_id=file_id)
+        self.folders = {folder["title"]: folder for folder in self.directory["folders"]}
 
-    directory = read_folder(
-        drive, "COMPSYS726 - Assignments", file_id=primary_folder_id
-    )
-
-    print_folders(directory)
+    def list_submissions(self):
+        return list(self.folders)
 
-    for folders in directory["folders"]:
-        upi = folders["title"]
-        print(f"Title: {upi}")
+    def fetch(self, job, deadline):
+        # Downloads cannot be interrupted, the deadline is checked between files
+        folders = self.folders[job.upi]
 
         files = folders["files"]
         requirements_id = files["requirements.txt"]["id"]
@@ -119,39 +254,125 @@ def main():
         model_folder = folders["folders"][0]
         logging.info(f"{model_folder=}")
 
-        requirement_path = f"{Path(__file__).parent.parent}"
-        logging.info(f"{requirement_path=}")
-
-        brock_path = f"{Path(__file__).parent.parent}/pyboy_environment/environments/pokemon/tasks"
-        logging.info(f"{brock_path=}")
-
-        results_path = f"{Path(__file__).parent.parent}/results/{upi}"
-        logging.info(f"Saving data into: {results_path}")
-
-        if not os.path.exists(results_path):
-            os.makedirs(results_path)
+        file = self.drive.CreateFile({"id": requirements_id})
+        file.GetContentFile(f"{job.workspace}/requirements.txt")
 
-        file = drive.CreateFile({"id": requirements_id})
-        file.GetContentFile(f"{requirement_path}/requirements.txt")
+        deadline.remaining()
+        file = self.drive.CreateFile({"id": brock_task_id})
+        file.GetContentFile(f"{job.workspace}/{BROCK_PATH}")
 
-        file = drive.CreateFile({"id": brock_task_id})
-        file.GetContentFile(f"{brock_path}/brock.py")
-
-        logging.info(f"{type(model_folder['files'])=}")
+        model_path = f"{job.results_path}/models"
+        if not os.path.exists(model_path):
+            os.makedirs(model_path)
 
+        model_name = None
         for file_name, model_info in model_folder["files"].items():
+            deadline.remaining()
             model_name = file_name.split("_")[0]
             logging.info(f"{file_name=}")
             logging.info(f"{model_info=}")
             logging.info(f"{model_name=}")
-            file = drive.CreateFile({"id": model_info["id"]})
-
-            model_path = f"{results_path}/models"
-            if not os.path.exists(model_path):
-                os.makedirs(model_path)
+            file = self.drive.CreateFile({"id": model_info["id"]})
             file.GetContentFile(f"{model_path}/{file_name}")
 
-        run_venv(upi, requirement_path, results_path, model_name)
+        return model_name
+
+
+def prepare_job(job, deadline):
+    return {"venv_dir": submission_venv(job.workspace, deadline=deadline)}
+
+
+def evaluate_job(job, deadline):
+    exit_code = run_evaluation(
+        job.venv_dir,
+        job.upi,
+        job.workspace,
+        job.results_path,
+        job.model_name,
+        deadline=deadline,
+    )
+    if exit_code != 0:
+        raise RuntimeError(f"evaluate.py exited with {exit_code}")
+    return {"exit_code": exit_code}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--local_path",
+        type=str,
+        default=None,
+        help="Evaluate submissions from this directory instead of Google Drive",
+    )
+    parser.add_argument(
+        "--journal",
+        type=str,
+        # Kept out of results/, which compare_results reads as one directory per UPI
+        default=f"{Path(__file__).parent.parent}/journal.jsonl",
+    )
+    parser.add_argument("--retry_failed", action="store_true")
+
+    parser.add_argument("--fetch_workers", type=int, default=4)
+    parser.add_argument("--prepare_workers", type=int, default=2)
+    parser.add_argument("--evaluate_workers", type=int, default=4)
+
+    # Per job timeouts in seconds
+    parser.add_argument("--fetch_timeout", type=float, default=None)
+    parser.add_argument("--prepare_timeout", type=float, default=3600)
+    parser.add_argument("--evaluate_timeout", type=float, default=7200)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.local_path is not None:
+        source = LocalDirectorySource(args.local_path)
+    else:
+        gauth = GoogleAuth()
+        gauth.LocalWebserverAuth()
+
+        drive = GoogleDrive(gauth)
+
+        # COMPSYS726 - Assignment 1 Folder
+        primary_folder_id = "1OWORBjdzuJjPZYZoCKMs4hI3xemvcDzh"
+
+        source = DriveSource(
+            drive, "COMPSYS726 - Assignments", file_id=primary_folder_id
+        )
+        print_folders(source.directory)
+
+    root_path = f"{Path(__file__).parent.parent}"
+    results_root = f"{root_path}/results"
+    os.makedirs(results_root, exist_ok=True)
+
+    # Each job evaluates its own copy of the package, so brock.py is never shared
+    scheduler = SubmissionScheduler(
+        source,
+        prepare_job,
+        evaluate_job,
+        JobJournal(args.journal),
+        template_path=root_path,
+        workspace_root=f"{Path.home()}/workspace/submissions",
+        results_root=results_root,
+        workers={
+            "fetch": args.fetch_workers,
+            "prepare": args.prepare_workers,
+            "evaluate": args.evaluate_workers,
+        },
+        timeouts={
+            "fetch": args.fetch_timeout,
+            "prepare": args.prepare_timeout,
+            "evaluate": args.evaluate_timeout,
+        },
+        retry_failed=args.retry_failed,
+    )
+
+    statuses = scheduler.run()
+    for upi, status in sorted(statuses.items()):
+        print(f"{upi}: {status}")
 
 
 if __name__ == "__main__":
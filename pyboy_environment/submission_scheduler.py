@@ -0,0 +1,350 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+STAGES = ("fetch", "prepare", "evaluate")
+
+BROCK_PATH = "pyboy_environment/environments/pokemon/tasks/brock.py"
+
+
+class Deadline:
+    # Remaining time of a stage's timeout, shared by every call the stage makes.
+    # Processes started through popen are killed when the stage is cancelled
+
+    def __init__(self, timeout: float = None) -> None:
+        self.end = None if timeout is None else time.monotonic() + timeout
+        self.cancelled = False
+        self._processes = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        # None without a timeout, raises TimeoutError once the time is up
+        if self.cancelled:
+            raise TimeoutError("Stage cancelled")
+        if self.end is None:
+            return None
+        remaining = self.end - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Stage timed out")
+        return remaining
+
+    def popen(self, *args, **kwargs) -> subprocess.Popen:
+        with self._lock:
+            self.remaining()
+            process = subprocess.Popen(*args, **kwargs)
+            self._processes.append(process)
+        return process
+
+    def run(self, *args, **kwargs) -> int:
+        # subprocess.run limited to the remaining time, returns the exit code
+        process = self.popen(*args, **kwargs)
+        try:
+            return process.wait(self.remaining())
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+    def cancel(self) -> None:
+        # Kills the stage's running processes, later calls raise TimeoutError
+        with self._lock:
+            self.cancelled = True
+            processes = list(self._processes)
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+
+
+class StageTimeout(TimeoutError):
+    def __init__(self, message: str, thread: threading.Thread) -> None:
+        super().__init__(message)
+        # Still winding down after its processes were killed
+        self.thread = thread
+
+
+class Job:
+    def __init__(self, upi: str, workspace: str, results_path: str) -> None:
+        self.upi = upi
+        # Private copy of the package so concurrent submissions never share brock.py
+        self.workspace = workspace
+        self.results_path = results_path
+        self.model_name = None
+        self.venv_dir = None
+
+    def update(self, info: dict) -> None:
+        for key in ("model_name", "venv_dir"):
+            if key in info:
+                setattr(self, key, info[key])
+
+
+class SubmissionSource(metaclass=ABCMeta):
+    @abstractmethod
+    def list_submissions(self) -> list[str]:
+        pass
+
+    @abstractmethod
+    def fetch(self, job: Job, deadline: Deadline) -> str:
+        # Writes requirements.txt into the workspace, brock.py into its task
+        # folder and the model files into results_path/models. Returns the model name.
+        # Should check deadline.remaining() between steps, the scheduler gives
+        # up on the job after the timeout regardless
+        pass
+
+
+class LocalDirectorySource(SubmissionSource):
+    # Same layout as the Drive folder: <root>/<upi>/{requirements.txt, brock.py, <model folder>/...}
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def list_submissions(self) -> list[str]:
+        return sorted(entry.name for entry in os.scandir(self.root) if entry.is_dir())
+
+    def fetch(self, job: Job, deadline: Deadline) -> str:
+        submission = Path(self.root) / job.upi
+        shutil.copyfile(
+            submission / "requirements.txt", f"{job.workspace}/requirements.txt"
+        )
+        deadline.remaining()
+        shutil.copyfile(submission / "brock.py", f"{job.workspace}/{BROCK_PATH}")
+
+        model_folder = sorted(p for p in submission.iterdir() if p.is_dir())[0]
+        model_path = f"{job.results_path}/models"
+        os.makedirs(model_path, exist_ok=True)
+
+        model_name = None
+        for model_file in sorted(model_folder.iterdir()):
+            deadline.remaining()
+            model_name = model_file.name.split("_")[0]
+            shutil.copyfile(model_file, f"{model_path}/{model_file.name}")
+        return model_name
+
+
+class JobJournal:
+    # Append only JSON lines log of every stage transition, used to resume batches
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> dict[str, dict]:
+        jobs = {}
+        if not os.path.exists(self.path):
+            return jobs
+
+        with open(self.path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Partial last line from an interrupted run
+                    continue
+                job = jobs.setdefault(entry["upi"], {})
+                job.update(entry)
+                if entry["status"] == "done":
+                    job["completed"] = entry["stage"]
+        return jobs
+
+    def record(self, upi: str, stage: str, status: str, **info) -> None:
+        entry = {"upi": upi, "stage": stage, "status": status, "time": time.time()}
+        entry.update(info)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(entry) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+
+class SubmissionScheduler:
+    """
+    Pipelines fetching, environment preparation and evaluation of submissions.
+
+    Every stage has its own bounded worker pool and per job timeout, a job
+    moves to the next stage as soon as it finishes the previous one. prepare
+    and evaluate are callables taking (job, deadline) that raise on failure and
+    return a dict of job info to record. When a stage times out the job fails
+    with TimeoutError and the deadline is cancelled, which kills the processes
+    it started. Its worker stays busy until the stage has stopped. Progress is
+    written to the journal so an interrupted batch restarts from the first
+    unfinished stage of each job.
+    """
+
+    def __init__(
+        self,
+        source: SubmissionSource,
+        prepare,
+        evaluate,
+        journal: JobJournal,
+        template_path: str,
+        workspace_root: str,
+        results_root: str,
+        workers: dict[str, int] = None,
+        timeouts: dict[str, float] = None,
+        retry_failed: bool = False,
+    ) -> None:
+        self.source = source
+        self.journal = journal
+        self.template_path = template_path
+        self.workspace_root = workspace_root
+        self.results_root = results_root
+        self.retry_failed = retry_failed
+
+        self.workers = {"fetch": 4, "prepare": 2, "evaluate": 4}
+        self.workers.update(workers or {})
+        self.timeouts = {stage: None for stage in STAGES}
+        self.timeouts.update(timeouts or {})
+
+        self._stage_functions = {
+            "fetch": self._fetch,
+            "prepare": prepare,
+            "evaluate": evaluate,
+        }
+
+        self._pools = None
+        self._remaining = 0
+        self._finished = threading.Condition()
+        self._statuses = {}
+
+    def run(self) -> dict[str, str]:
+        previous = self.journal.load()
+
+        jobs = []
+        for upi in self.source.list_submissions():
+            job = Job(
+                upi,
+                f"{self.workspace_root}/{upi}",
+                f"{self.results_root}/{upi}",
+            )
+            state = previous.get(upi, {})
+            job.update(state)
+
+            completed = state.get("completed")
+            stage_index = STAGES.index(completed) + 1 if completed else 0
+            if stage_index == len(STAGES):
+                logging.info(f"Skipping {upi} - already evaluated")
+                self._statuses[upi] = "done"
+                continue
+            if state.get("status") == "failed" and not self.retry_failed:
+                logging.info(f"Skipping {upi} - failed at {state['stage']}")
+                self._statuses[upi] = "failed"
+                continue
+            jobs.append((job, stage_index))
+
+        self._remaining = len(jobs)
+        self._pools = {
+            stage: ThreadPoolExecutor(
+                max_workers=self.workers[stage], thread_name_prefix=stage
+            )
+            for stage in STAGES
+        }
+        try:
+            for job, stage_index in jobs:
+                self._submit(job, stage_index)
+
+            with self._finished:
+                self._finished.wait_for(lambda: self._remaining == 0)
+        finally:
+            for pool in self._pools.values():
+                pool.shutdown(wait=False, cancel_futures=True)
+
+        return self._statuses
+
+    def _submit(self, job: Job, stage_index: int) -> None:
+        stage = STAGES[stage_index]
+        self._pools[stage].submit(self._run_stage, job, stage_index)
+
+    def _run_stage(self, job: Job, stage_index: int) -> None:
+        # Every job either moves to the next stage or finishes, even when the
+        # journal cannot be written, otherwise run() waits forever
+        stage = STAGES[stage_index]
+        status = "failed"
+        straggler = None
+        try:
+            self.journal.record(job.upi, stage, "started")
+            start = time.time()
+            try:
+                info = self._call_stage(stage, job) or {}
+            except Exception as error:
+                if isinstance(error, StageTimeout):
+                    straggler = error.thread
+                logging.error(f"{job.upi} failed at {stage}: {error!r}")
+                self.journal.record(
+                    job.upi,
+                    stage,
+                    "failed",
+                    error=repr(error),
+                    duration=time.time() - start,
+                )
+                return
+
+            job.update(info)
+            self.journal.record(
+                job.upi, stage, "done", duration=time.time() - start, **info
+            )
+
+            if stage_index + 1 < len(STAGES):
+                self._submit(job, stage_index + 1)
+                status = None
+            else:
+                status = "done"
+        except Exception as error:
+            logging.error(f"{job.upi} failed at {stage}: {error!r}")
+        finally:
+            if status is not None:
+                self._finish(job, status)
+            if straggler is not None:
+                # The worker counts as busy until the timed out stage has
+                # stopped, so a stage never runs more jobs than it has workers
+                straggler.join()
+
+    def _call_stage(self, stage: str, job: Job) -> dict:
+        # The stage runs on its own thread so the timeout holds even for calls
+        # that cannot be interrupted, e.g. a stuck download
+        function = self._stage_functions[stage]
+        timeout = self.timeouts[stage]
+        deadline = Deadline(timeout)
+        if timeout is None:
+            return function(job, deadline)
+
+        result = {}
+
+        def call() -> None:
+            try:
+                result["info"] = function(job, deadline)
+            except BaseException as error:
+                result["error"] = error
+
+        thread = threading.Thread(target=call, name=f"{stage}-{job.upi}", daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if thread.is_alive():
+            deadline.cancel()
+            raise StageTimeout(f"{stage} took longer than {timeout}s", thread)
+        if "error" in result:
+            raise result["error"]
+        return result["info"]
+
+    def _finish(self, job: Job, status: str) -> None:
+        with self._finished:
+            self._statuses[job.upi] = status
+            self._remaining -= 1
+            self._finished.notify_all()
+
+    def _fetch(self, job: Job, deadline: Deadline) -> dict:
+        shutil.rmtree(job.workspace, ignore_errors=True)
+        shutil.copytree(
+            f"{self.template_path}/pyboy_environment",
+            f"{job.workspace}/pyboy_environment",
+            ignore=shutil.ignore_patterns("__pycache__"),
+        )
+        os.makedirs(job.results_path, exist_ok=True)
+
+        model_name = self.source.fetch(job, deadline)
+        return {"model_name": model_name}
@@ -1,5 +1,11 @@
+from typing import Callable
+
+import numpy as np
+
 from pyboy_environment.environments import PyboyEnvironment
 from pyboy_environment.environments.mario.mario_run import MarioRun
+from pyboy_environment.environments.pixels import PixelObservation
+from pyboy_environment.environments.tile_grid import TileGridObservation
 from pyboy_environment.environments.pokemon.tasks.brock import PokemonBrock
 
 
@@ -9,16 +15,36 @@ def make(
     act_freq: int,
     emulation_speed: int = 0,
     headless: bool = False,
+    backend: Callable = None,
+    observation_dtype: np.dtype = np.float64,
+    pixels: PixelObservation = None,
+    tile_grid: TileGridObservation = None,
 ) -> PyboyEnvironment:
 
     if domain == "mario":
         if task == "run":
-            env = MarioRun(act_freq, emulation_speed, headless)
+            env = MarioRun(
+                act_freq,
+                emulation_speed,
+                headless,
+                backend=backend,
+                observation_dtype=observation_dtype,
+                pixels=pixels,
+                tile_grid=tile_grid,
+            )
         else:
             raise ValueError(f"Unknown Mario task: {task}")
     elif domain == "pokemon":
         if task == "brock":
-            env = PokemonBrock(act_freq, emulation_speed, headless)
+            env = PokemonBrock(
+                act_freq,
+                emulation_speed,
+                headless,
+                backend=backend,
+                observation_dtype=observation_dtype,
+                pixels=pixels,
+                tile_grid=tile_grid,
+            )
         else:
             raise ValueError(f"Unknown Pokemon task: {task}")
     else:
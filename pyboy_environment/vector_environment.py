@@ -0,0 +1,504 @@
+import asyncio
+import copy
+import multiprocessing as mp
+import pickle
+import traceback
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable
+
+import numpy as np
+
+from pyboy_environment import suite
+from pyboy_environment.environments.pixels import PixelObservation
+from pyboy_environment.environments.tile_grid import TileGridObservation
+
+# Every message is sent with send_bytes, replies start with _OK or _ERROR and
+# anything larger than a command is pickled after that prefix
+_STEP = b"s"
+_RESET = b"r"
+_CLOSE = b"c"
+_OK = b"."
+_ERROR = b"!"
+
+
+def _shared_fields(
+    num_envs: int, observation_shape: tuple, action_num: int, dtype: np.dtype
+) -> list[tuple[str, tuple, np.dtype]]:
+    # Fixed layout of the shared block, used by both the parent and the workers
+    return [
+        ("observations", (num_envs, *observation_shape), np.dtype(dtype)),
+        ("final_observations", (num_envs, *observation_shape), np.dtype(dtype)),
+        ("actions", (num_envs, action_num), np.dtype(np.float64)),
+        ("rewards", (num_envs,), np.dtype(np.float64)),
+        ("dones", (num_envs,), np.dtype(np.bool_)),
+        ("truncated", (num_envs,), np.dtype(np.bool_)),
+    ]
+
+
+def _aligned_size(shape: tuple, dtype: np.dtype) -> int:
+    # Keep every field 8 byte aligned
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    return -(-nbytes // 8) * 8
+
+
+def _shared_size(
+    num_envs: int, observation_shape: tuple, action_num: int, dtype: np.dtype
+) -> int:
+    return sum(
+        _aligned_size(shape, field_dtype)
+        for _, shape, field_dtype in _shared_fields(
+            num_envs, observation_shape, action_num, dtype
+        )
+    )
+
+
+def _shared_buffers(
+    buffer,
+    num_envs: int,
+    observation_shape: tuple,
+    action_num: int,
+    dtype: np.dtype,
+) -> dict[str, np.ndarray]:
+    buffers = {}
+    offset = 0
+    for name, shape, field_dtype in _shared_fields(
+        num_envs, observation_shape, action_num, dtype
+    ):
+        buffers[name] = np.ndarray(
+            shape, dtype=field_dtype, buffer=buffer, offset=offset
+        )
+        offset += _aligned_size(shape, field_dtype)
+    return buffers
+
+
+def _observation_spec(env, state: np.ndarray) -> tuple:
+    # Shape, dtype and schema of the observations, from the declared schema if any
+    schema = env.observation_schema()
+    if schema is None:
+        return state.shape, state.dtype, None
+    return (schema["size"],), np.dtype(schema["dtype"]), schema
+
+
+def _worker(
+    conn,
+    index: int,
+    domain: str,
+    task: str,
+    act_freq: int,
+    emulation_speed: int,
+    headless: bool,
+    make_kwargs: dict,
+) -> None:
+    try:
+        env = suite.make(
+            domain, task, act_freq, emulation_speed, headless, **make_kwargs
+        )
+        state = np.asarray(env.reset())
+        spec = (
+            *_observation_spec(env, state),
+            env.action_num,
+            env.min_action_value,
+            env.max_action_value,
+        )
+        conn.send_bytes(_OK + pickle.dumps(spec))
+    except Exception:
+        conn.send_bytes(_ERROR + traceback.format_exc().encode())
+        conn.close()
+        return
+
+    # The parent closes every worker if any of them failed to start
+    message = conn.recv_bytes()
+    if message == _CLOSE:
+        env.close()
+        conn.close()
+        return
+    name, num_envs, dtype = pickle.loads(message)
+    shared_memory = SharedMemory(name=name)
+    buffers = _shared_buffers(
+        shared_memory.buf, num_envs, state.shape, env.action_num, dtype
+    )
+    # Observations are written in place when the environment supports it
+    observations = buffers["observations"][index]
+    observations[...] = state
+    env.set_observation_buffer(observations)
+    conn.send_bytes(_OK)
+
+    try:
+        while True:
+            command = conn.recv_bytes()
+            if command == _CLOSE:
+                break
+
+            try:
+                if command == _STEP:
+                    action = buffers["actions"][index].copy()
+                    state, reward, done, truncated = env.step(action)
+                    buffers["final_observations"][index] = state
+                    if done or truncated:
+                        state = env.reset()
+                    if state is not observations:
+                        observations[...] = state
+                    buffers["rewards"][index] = reward
+                    buffers["dones"][index] = done
+                    buffers["truncated"][index] = truncated
+                elif command == _RESET:
+                    state = env.reset()
+                    if state is not observations:
+                        observations[...] = state
+            except Exception:
+                conn.send_bytes(_ERROR + traceback.format_exc().encode())
+            else:
+                conn.send_bytes(_OK)
+    finally:
+        del buffers
+        shared_memory.close()
+        env.close()
+        conn.close()
+
+
+class VectorPyboyEnvironment:
+    """
+    Runs num_envs copies of a suite environment in worker processes.
+
+    Observations, rewards and flags are exchanged through one shared memory
+    block, the only per step messages are single byte commands. Environments
+    that finish an episode are reset automatically - the observation that
+    ended the episode is kept in final_observations.
+
+    astep and areset are the asyncio versions, the event loop keeps running
+    while the workers emulate in parallel.
+    """
+
+    def __init__(
+        self,
+        domain: str,
+        task: str,
+        num_envs: int,
+        act_freq: int,
+        emulation_speed: int = 0,
+        headless: bool = True,
+        observation_dtype: np.dtype = np.float64,
+        copy: bool = True,
+        start_method: str = None,
+        backend: Callable = None,
+        pixels: PixelObservation = None,
+        tile_grid: TileGridObservation = None,
+    ) -> None:
+        self.domain = domain
+        self.task = task
+        self.num_envs = num_envs
+        # Without copying the returned arrays are views into shared memory that
+        # are overwritten by the next step
+        self.copy = copy
+
+        context = mp.get_context(start_method)
+
+        # Workers must share the parent's tracker, otherwise each of them unlinks
+        # the shared block as leaked when it exits (Python < 3.13)
+        resource_tracker.ensure_running()
+
+        # Passed on to suite.make, every worker gets its own copy
+        make_kwargs = {
+            "backend": backend,
+            "observation_dtype": observation_dtype,
+            "pixels": pixels,
+            "tile_grid": tile_grid,
+        }
+
+        self._connections = []
+        self._processes = []
+        for index in range(num_envs):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_worker,
+                args=(
+                    child_conn,
+                    index,
+                    domain,
+                    task,
+                    act_freq,
+                    emulation_speed,
+                    headless,
+                    make_kwargs,
+                ),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            self._connections.append(parent_conn)
+            self._processes.append(process)
+
+        self._shared_memory = None
+        self._closed = False
+
+        try:
+            specs = [pickle.loads(reply) for reply in self._receive()]
+        except RuntimeError:
+            self.close()
+            raise
+
+        # The shared observations are laid out as the environments declare them
+        (
+            self.observation_shape,
+            self.dtype,
+            self.observation_schema,
+            self.action_num,
+            self.min_action_value,
+            self.max_action_value,
+        ) = specs[0]
+
+        size = _shared_size(
+            num_envs, self.observation_shape, self.action_num, self.dtype
+        )
+        self._shared_memory = SharedMemory(create=True, size=size)
+        self._buffers = _shared_buffers(
+            self._shared_memory.buf,
+            num_envs,
+            self.observation_shape,
+            self.action_num,
+            self.dtype,
+        )
+
+        self._send(pickle.dumps((self._shared_memory.name, num_envs, self.dtype)))
+        self._wait()
+
+    @property
+    def observation_space(self) -> int:
+        return int(np.prod(self.observation_shape))
+
+    @property
+    def final_observations(self) -> np.ndarray:
+        return self._output(self._buffers["final_observations"])
+
+    def sample_action(self) -> np.ndarray:
+        return np.random.uniform(
+            self.min_action_value,
+            self.max_action_value,
+            size=(self.num_envs, self.action_num),
+        )
+
+    def reset(self) -> np.ndarray:
+        self._send(_RESET)
+        self._wait()
+        return self._output(self._buffers["observations"])
+
+    def step(self, actions) -> tuple:
+        self._send_actions(actions)
+        self._wait()
+        return self._step_result()
+
+    async def areset(self) -> np.ndarray:
+        # The workers emulate in parallel while the event loop keeps running.
+        # Only one call may be pending at a time
+        self._send(_RESET)
+        await self._await_replies()
+        return self._output(self._buffers["observations"])
+
+    async def astep(self, actions) -> tuple:
+        self._send_actions(actions)
+        await self._await_replies()
+        return self._step_result()
+
+    def _send_actions(self, actions) -> None:
+        self._buffers["actions"][:] = np.reshape(
+            actions, (self.num_envs, self.action_num)
+        )
+        self._send(_STEP)
+
+    def _step_result(self) -> tuple:
+        return (
+            self._output(self._buffers["observations"]),
+            self._output(self._buffers["rewards"]),
+            self._output(self._buffers["dones"]),
+            self._output(self._buffers["truncated"]),
+        )
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+
+        for conn in self._connections:
+            try:
+                conn.send_bytes(_CLOSE)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for conn in self._connections:
+            conn.close()
+
+        if self._shared_memory is not None:
+            self._buffers = None
+            self._shared_memory.close()
+            self._shared_memory.unlink()
+
+    def __enter__(self) -> "VectorPyboyEnvironment":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _output(self, array: np.ndarray) -> np.ndarray:
+        return array.copy() if self.copy else array
+
+    def _send(self, message: bytes) -> None:
+        for conn in self._connections:
+            try:
+                conn.send_bytes(message)
+            except OSError:
+                # The worker is gone, _receive reports it once the others replied
+                pass
+
+    def _wait(self) -> None:
+        self._receive()
+
+    async def _await_replies(self) -> None:
+        # Waiting on the pipes releases the GIL, so a thread is enough here
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._receive)
+
+    def _receive(self) -> list[bytes]:
+        # One reply from every worker, the payloads after the _OK prefix.
+        # Every worker is read before raising so none is left with a pending reply
+        replies = []
+        errors = []
+        for index, conn in enumerate(self._connections):
+            try:
+                reply = conn.recv_bytes()
+            except (EOFError, OSError):
+                errors.append(self._worker_exited(index))
+                continue
+            if reply.startswith(_ERROR):
+                errors.append(f"Environment {index}:\n{reply[1:].decode()}")
+            else:
+                replies.append(reply[1:])
+        if errors:
+            raise RuntimeError("\n".join(errors))
+        return replies
+
+    def _worker_exited(self, index: int) -> str:
+        process = self._processes[index]
+        process.join(timeout=1)
+        return f"Environment {index} worker exited unexpectedly (exit code {process.exitcode})"
+
+
+class BatchPyboyEnvironment:
+    """
+    Steps num_envs copies of a suite environment one after another in this process.
+
+    Same interface as VectorPyboyEnvironment without the worker processes, so
+    imports and the interpreter are shared. Environments must keep their
+    episode state per instance, as PokemonBrock does.
+    """
+
+    def __init__(
+        self,
+        domain: str,
+        task: str,
+        num_envs: int,
+        act_freq: int,
+        emulation_speed: int = 0,
+        headless: bool = True,
+        observation_dtype: np.dtype = np.float64,
+        backend: Callable = None,
+        pixels: PixelObservation = None,
+        tile_grid: TileGridObservation = None,
+    ) -> None:
+        self.domain = domain
+        self.task = task
+        self.num_envs = num_envs
+
+        # Pixel and tile grid observations keep per environment buffers
+        self.environments = [
+            suite.make(
+                domain,
+                task,
+                act_freq,
+                emulation_speed,
+                headless,
+                backend=backend,
+                observation_dtype=observation_dtype,
+                pixels=copy.deepcopy(pixels),
+                tile_grid=copy.deepcopy(tile_grid),
+            )
+            for _ in range(num_envs)
+        ]
+        env = self.environments[0]
+        self.action_num = env.action_num
+        self.min_action_value = env.min_action_value
+        self.max_action_value = env.max_action_value
+
+        states = [np.asarray(env.reset()) for env in self.environments]
+        self.observation_shape, self.dtype, self.observation_schema = _observation_spec(
+            env, states[0]
+        )
+
+        self._observations = np.empty(
+            (num_envs, *self.observation_shape), dtype=self.dtype
+        )
+        self._observations[:] = states
+        self._final_observations = np.zeros_like(self._observations)
+        # One view per environment, state observations are written into them in place
+        self._rows = list(self._observations)
+        for env, row in zip(self.environments, self._rows):
+            env.set_observation_buffer(row)
+        self._closed = False
+
+    @property
+    def observation_space(self) -> int:
+        return int(np.prod(self.observation_shape))
+
+    @property
+    def final_observations(self) -> np.ndarray:
+        return self._final_observations.copy()
+
+    def sample_action(self) -> np.ndarray:
+        return np.random.uniform(
+            self.min_action_value,
+            self.max_action_value,
+            size=(self.num_envs, self.action_num),
+        )
+
+    def reset(self) -> np.ndarray:
+        for index, env in enumerate(self.environments):
+            self._write(index, env.reset())
+        return self._observations.copy()
+
+    def step(self, actions) -> tuple:
+        actions = np.reshape(actions, (self.num_envs, self.action_num))
+        rewards = np.zeros(self.num_envs, dtype=np.float64)
+        dones = np.zeros(self.num_envs, dtype=np.bool_)
+        truncated = np.zeros(self.num_envs, dtype=np.bool_)
+
+        for index, env in enumerate(self.environments):
+            state, rewards[index], dones[index], truncated[index] = env.step(
+                actions[index]
+            )
+            self._final_observations[index] = state
+            if dones[index] or truncated[index]:
+                state = env.reset()
+            self._write(index, state)
+
+        return self._observations.copy(), rewards, dones, truncated
+
+    def _write(self, index: int, state: np.ndarray) -> None:
+        if state is not self._rows[index]:
+            self._rows[index][...] = state
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+
+        for env in self.environments:
+            env.close()
+
+    def __enter__(self) -> "BatchPyboyEnvironment":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from pyboy_environment import suite
+from pyboy_environment.environments.fake_pyboy import MEMORY_SIZE, fake_backend
+from pyboy_environment.environments.pixels import PixelObservation
+from pyboy_environment.environments.pokemon.pokemon_environment import pokemon_tile_grid
+
+# wTilesetCollisionPtr points at an empty collision list, so no tile is walkable
+COLLISION_PTR = 0xD530
+COLLISION_LIST = 0x4000
+
+
+def blocked_map() -> np.ndarray:
+    snapshot = np.zeros((1, MEMORY_SIZE), dtype=np.uint8)
+    snapshot[0, COLLISION_PTR : COLLISION_PTR + 2] = [
+        COLLISION_LIST & 0xFF,
+        COLLISION_LIST >> 8,
+    ]
+    snapshot[0, COLLISION_LIST] = 0xFF
+    return snapshot
+
+
+def rewards(steps: int = 5, **kwargs) -> list[float]:
+    env = suite.make(
+        "pokemon",
+        "brock",
+        24,
+        headless=True,
+        backend=fake_backend(snapshots=blocked_map()),
+        **kwargs,
+    )
+    try:
+        env.reset()
+        return [env.step([0.1])[1] for _ in range(steps)]
+    finally:
+        env.close()
+
+
+@pytest.mark.parametrize(
+    "observation",
+    [{"pixels": PixelObservation()}, {"tile_grid": pokemon_tile_grid()}],
+    ids=["pixels", "tile_grid"],
+)
+def test_reward_does_not_depend_on_observation_mode(observation):
+    assert rewards(**observation) == rewards()
+
+
+def test_walls_are_penalised():
+    # -1 for standing still, -0.1 for each of the four blocked directions
+    assert rewards()[1:] == pytest.approx([-0.9] * 4)
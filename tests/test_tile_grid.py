@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pyboy
+import pytest
+from pyboy import PyBoy
+
+from pyboy_environment import suite
+from pyboy_environment.environments.fake_pyboy import MEMORY_SIZE, fake_backend
+from pyboy_environment.environments.pokemon.pokemon_environment import (
+    pokemon_tile_grid,
+)
+from pyboy_environment.environments.tile_grid import (
+    OAM_ADDRESS,
+    TileGridObservation,
+)
+from pyboy_environment.environments.tilemap import LCDC_ADDRESS, LOW_TILEMAP
+
+# pyboy's own boot ROM, it scrolls SCX per scanline and keeps SCY as written
+DEFAULT_ROM = os.path.join(os.path.dirname(pyboy.__file__), "default_rom.gb")
+SCY_ADDRESS = 0xFF42
+SCX_ADDRESS = 0xFF43
+
+
+@pytest.fixture(scope="module")
+def emulator():
+    pb = PyBoy(DEFAULT_ROM, window="null")
+    pb.tick(60, True)
+    # The screen sized game area, following the scroll of each tile row
+    pb.game_wrapper._set_dimensions(0, 0, 20, 18, True)
+    yield pb
+    pb.stop(save=False)
+
+
+@pytest.mark.parametrize("scx, scy", [(3, 5), (13, 11), (250, 250)])
+def test_rows_match_game_area_when_not_tile_aligned(emulator, scx, scy):
+    emulator.memory[SCX_ADDRESS] = scx
+    emulator.memory[SCY_ADDRESS] = scy
+    emulator.tick(1, True)
+
+    game_area = emulator.game_area()
+    scrolls = emulator.screen.tilemap_position_list
+    assert any(scrolls[row * 8][0] % 8 for row in range(18))
+
+    # A band of one row reads its scroll from the same scanline as pyboy
+    for row in range(18):
+        band = TileGridObservation(first_row=row, rows=1)
+        np.testing.assert_array_equal(
+            band.observe(emulator.memory, emulator.screen)[0], game_area[row]
+        )
+
+
+def test_pokemon_tile_grid_is_compact():
+    snapshot = np.zeros((1, MEMORY_SIZE), dtype=np.uint8)
+    # Signed tile data, as Pokemon always uses for the background
+    snapshot[0, LCDC_ADDRESS] = 0x00
+    snapshot[0, LOW_TILEMAP : LOW_TILEMAP + 4] = [0x05, 0x65, 0x80, 0xED]
+    # One sprite in the second row and column
+    snapshot[0, OAM_ADDRESS : OAM_ADDRESS + 4] = [16 + 8, 8 + 8, 0x03, 0x00]
+
+    env = suite.make(
+        "pokemon",
+        "brock",
+        24,
+        headless=True,
+        backend=fake_backend(snapshots=snapshot),
+        tile_grid=pokemon_tile_grid(),
+    )
+    try:
+        grid = env.reset()
+    finally:
+        env.close()
+
+    assert grid.dtype == np.uint8
+    assert grid.shape == (18, 20)
+    # Tileset, text box frame, a font glyph and the ▶ cursor, then the sprite
+    assert grid[0, :4].tolist() == [6, 102, 129, 131]
+    assert grid[1, 1] == 133